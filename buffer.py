@@ -3,7 +3,7 @@ try:
 except ImportError:
 	raise "This module is only available from vim!"
 
-import re, locale
+import re, locale, bisect
 
 #----EXCEPTION MSGS----
 
@@ -46,6 +46,7 @@ class MatchObject:
 
 	mo		- true match object
 	encoding	- encoding for convert unicode objects
+	base		- byte offset of mo.string in buffer
 	lastindex	- integer index of the last matched capturing group, or None
 	lastgroup	- the name of the last matched capturing group, or None
 	re		- regex object, which match() or search() method returned
@@ -56,7 +57,8 @@ class MatchObject:
 	endpos		- value of endpos which was passed to the search() or match()
 				method
 	"""
-	def __init__(self, mo, encoding, old_mo=None):
+	def __init__(self, mo, encoding, old_mo=None, base=0):
+		self.base	= base
 		if old_mo:
 			for i in ["string", "pos", "endpos"]:
 				setattr(self, i, getattr(old_mo, i))
@@ -133,9 +135,9 @@ class MatchObject:
 		Return the index of the start of the substring matched by GROUP
 		"""
 		if isinstance(self.mo.string, str):
-			return _true_offset(self.mo.string, self.mo.start(gr), self.encoding)
+			return _true_offset(self.mo.string, self.mo.start(gr), self.encoding) + self.base
 		else:
-			return self.mo.start(gr)
+			return self.mo.start(gr) + self.base
 
 	def end(self, gr=0):
 		"""
@@ -144,9 +146,9 @@ class MatchObject:
 		Return the index of the end of the substring matched by GROUP
 		"""
 		if isinstance(self.mo.string, str):
-			return _true_offset(self.mo.string, self.mo.end(gr), self.encoding)
+			return _true_offset(self.mo.string, self.mo.end(gr), self.encoding) + self.base
 		else:
-			return self.mo.end(gr)
+			return self.mo.end(gr) + self.base
 
 	def span(self, gr=0):
 		"""
@@ -234,17 +236,27 @@ class _RegExp:
 		result	= re.findall(pattern, self.master.decode())
 		return result
 
-	def finditer(self, pattern):
+	def finditer(self, pattern, first=None, last=None):
 		"""
 		Return:		iterator_object
 
 		Return an iterator over all non-overlapping matches for the RE
 		pattern in string
+		If FIRST or LAST (zero-leader, LAST is not included) are given,
+		only these lines of buffer are read and searched. Offsets
+		of matches are still counted from the beginning of buffer
 		"""
 		pattern	= self.compile(pattern)
 		old_mo	= None
-		for i in re.finditer(pattern, self.master.decode()):
-			mo	= MatchObject(i, self.master.encoding, old_mo)
+		if first is None and last is None:
+			text	= self.master.decode()
+			base	= 0
+		else:
+			first	= first or 0
+			text	= self.master.newlines.join(self.master.buffer[first:last])
+			base	= self.master.line_offset(first)
+		for i in re.finditer(pattern, text):
+			mo	= MatchObject(i, self.master.encoding, old_mo, base)
 			old_mo	= mo
 			yield mo
 
@@ -306,14 +318,19 @@ class Buffer:
 	(current buffer by default)
 
 	Buffer contents are stored in instance.text attribute
+	With STREAM argument the text is not joined until some
+	string-emulation method needs it: scanning goes through lines()
 
 	--------------------------------------------------------------
 	Synchronyzation methods:
 	
-		General: vim2py(), py2vim()
+		General: vim2py(), py2vim(), lines()
 
 		Offset converting: offset2LC(), LC2offset()
 
+		Encoded contents: encoded_lines(), encoded(), encoded_line(),
+		encoded_lines_at(), patch(), substitute()
+
 	--------------------------------------------------------------
 	String emulation:
 
@@ -345,21 +362,31 @@ class Buffer:
 	Instance of this class has some file-object like methods and may
 	be used for file simulation
 
-	isatty(), close(), flush(), tell(), seek(), truncate(), read(),
+	isatty(), close(), flush(), tell(), seek(), sync(), truncate(), read(),
 	readline(), readlines(), write(), writelines()
 
 	---------------------------------------------------------------
 	Attributes
 
 	instance.text		unicode object, containing buffer contents
+				(joined lazily in STREAM mode)
+	instance.stream		True, if buffer was created in STREAM mode
 	instance.newlines	EOL string ('\\r' or '\\r\\n' or '\\n')
 	instance.encoding	buffer encoding (vim's &encoding)
 	instance.buffer		vim.buffer object
 
+	Reading keeps an encoded snapshot of buffer (see encoded()),
+	which is patched in place by edits of the same length (see
+	patch()) and dropped by other edits, and its own cursor, so
+	reading line by line costs linear time. sync() moves vim's
+	cursor to it
+
 	instance.closed		False
 	instance.mode		'rb+'
 	"""
-	def __init__(self, buffer=vim.current.buffer):
+	def __init__(self, buffer=vim.current.buffer, stream=False):
+		self.stream	= stream
+		self.__pos	= None
 		self.vim2py(buffer)
 
 		self.re		= _RegExp(self)
@@ -378,7 +405,13 @@ class Buffer:
 		data: self.text, self.buffer, self.newlines and
 		self.encoding
 		"""
-		self.newlines	= NEWLINES[vim.eval("&fileformat")]
+		try:
+			fileformat	= buffer.options["fileformat"]
+		except (AttributeError, KeyError):
+			fileformat	= vim.eval("&fileformat")
+		if isinstance(fileformat, bytes):
+			fileformat	= fileformat.decode()
+		self.newlines	= NEWLINES[fileformat]
 		self.encoding	= re.sub(r"^(?:8bit|2byte)-", "", vim.eval("&encoding"))
 
 		try:
@@ -392,8 +425,14 @@ class Buffer:
 			except KeyError:
 				raise LookupError("This module is not provided with %s"\
 						"codec" % self.encoding)
-		self.text	= self.newlines.join(buffer)
 		self.buffer	= buffer
+		self.__text	= None
+		if not self.stream:
+			self.__text	= self.newlines.join(buffer)
+
+		self.__lines	= None
+		self.__offsets	= None
+		self.__data	= None
 
 	def py2vim(self):
 		"""
@@ -402,6 +441,46 @@ class Buffer:
 		Write self.text into vim.buffer
 		"""
 		self.buffer[:] = self.text.split(self.newlines)
+		if self.stream:
+			self.__text	= None
+
+		self.__lines	= None
+		self.__offsets	= None
+		self.__data	= None
+
+	@property
+	def text(self):
+		if self.__text is None:
+			self.__text	= self.newlines.join(self.buffer)
+		return self.__text
+
+	@text.setter
+	def text(self, value):
+		self.__text	= value
+
+	def lines(self, first=0, last=None, encoded=False, chunk=1024):
+		"""
+		Return:		generator
+
+		Yields (number, line) pairs for buffer lines from FIRST
+		to LAST (zero-leader, LAST is not included)
+		Lines are read from vim by CHUNK lines, so the whole buffer
+		is never copied at once
+		If ENCODED, lines are bytes in self.encoding codec
+		"""
+		if last is None:
+			last	= len(self.buffer)
+		for i in range(first, last, chunk):
+			stop	= min(i + chunk, last)
+			if not encoded:
+				block	= self.buffer[i:stop]
+			elif hasattr(vim, "bindeval"):
+				block	= vim.bindeval("getbufline(%d, %d, %d)" % (
+						self.buffer.number, i + 1, stop))
+			else:
+				block	= [j.encode(self.encoding) for j in self.buffer[i:stop]]
+			for j, line in enumerate(block, i):
+				yield j, line
 
 	def offset2LC(self, offset):
 		"""
@@ -425,27 +504,248 @@ class Buffer:
 		result	= result + column - 2
 		return result
 
+	#----encoded contents----
+
+	def encoded_lines(self):
+		"""
+		Return:		list
+
+		Returns buffer lines as bytes in self.encoding codec
+		If vim has bindeval(), lines are taken from vim without
+		decoding at all
+		"""
+		if self.__lines is None:
+			if hasattr(vim, "bindeval"):
+				self.__lines	= list(vim.bindeval("getbufline(%d, 1, '$')"
+							% self.buffer.number))
+			else:
+				self.__lines	= [i.encode(self.encoding) for i in self.buffer]
+		return self.__lines
+
+	def encoded(self):
+		"""
+		Return:		bytearray
+
+		Returns buffer contents in self.encoding codec
+		Byte offsets in it are the same as in tell(), seek(),
+		offset2LC() and LC2offset()
+		The array is mutable: patch() changes it in place, so
+		it is joined only once
+		"""
+		if self.__data is None:
+			self.__data	= bytearray(self.newlines.encode(self.encoding)).join(
+						self.encoded_lines())
+		return self.__data
+
+	def encoded_line(self, number):
+		"""
+		Return:		bytes
+
+		Returns line NUMBER (zero-leader) in self.encoding codec
+		"""
+		if self.__lines is not None:
+			return self.__lines[number]
+		if hasattr(vim, "bindeval"):
+			return bytes(vim.bindeval("getbufline(%d, %d)" % (
+					self.buffer.number, number + 1))[0])
+		return self.buffer[number].encode(self.encoding)
+
+	def encoded_lines_at(self, numbers):
+		"""
+		Return:		dict
+
+		Returns {number: line} for line NUMBERS (zero-leader) in
+		self.encoding codec. Lines from the first to the last of
+		NUMBERS are taken from vim at once
+		"""
+		numbers	= set(numbers)
+		if not numbers:
+			return {}
+		if self.__lines is not None:
+			return dict((i, self.__lines[i]) for i in numbers)
+		first, last	= min(numbers), max(numbers) + 1
+		if hasattr(vim, "bindeval"):
+			block	= vim.bindeval("getbufline(%d, %d, %d)" % (
+					self.buffer.number, first + 1, last))
+			return dict((i, bytes(line)) for i, line in enumerate(block, first)
+					if i in numbers)
+		return dict((i, line.encode(self.encoding)) for i, line in
+				enumerate(self.buffer[first:last], first) if i in numbers)
+
+	def line_offset(self, number):
+		"""
+		Return:		int
+
+		Returns byte offset of the beginning of line NUMBER
+		(zero-leader)
+		"""
+		if self.__offsets is not None:
+			return self.__offsets[number]
+		if number == 0:
+			return 0
+		if self.buffer.number == vim.current.buffer.number:
+			return int(vim.eval("line2byte(%d)" % (number + 1))) - 1
+		# line2byte() counts lines of the current buffer only
+		width	= len(self.newlines.encode(self.encoding))
+		return sum(len(line) + width for i, line in self.lines(0, number, encoded=True))
+
+	def size(self):
+		"""
+		Return:		int
+
+		Returns length of encoded() without joining the buffer:
+		offset of the last line plus its length
+		"""
+		if self.__data is not None:
+			return len(self.__data)
+		last	= len(self.buffer) - 1
+		if last < 0:
+			return 0
+		return self.line_offset(last) + len(self.encoded_line(last))
+
+	def line_offsets(self):
+		"""
+		Return:		list
+
+		Returns byte offsets of the beginnings of buffer lines
+		"""
+		if self.__offsets is None:
+			width	= len(self.newlines.encode(self.encoding))
+			offset	= 0
+			result	= []
+			for i in self.encoded_lines():
+				result.append(offset)
+				offset += len(i) + width
+			self.__offsets	= result
+		return self.__offsets
+
+	def patch(self, edits):
+		"""
+		Return:		None
+
+		Applies EDITS - iterable of (start, end, bytes [, line, column])
+		tuples with byte offsets in encoded() contents - to the buffer
+		and rewrites only touched lines in vim. If LINE and COLUMN
+		(zero-leader) are given, offsets are not converted at all
+		Edits must not cross line boundaries
+
+		Edits are applied from the end, in place: to the lines and
+		to encoded() array, if it was built. A replacement of the
+		same length (like 'е' -> 'ё') costs its own length only and
+		keeps offsets of every other edit and of line_offsets()
+		valid, so nothing is joined or indexed again. Runs of
+		adjacent touched lines are sent to vim by one assignment
+
+		self.text is joined again, when it is needed next time
+		"""
+		changed	= {}
+		resized	= False
+		data	= self.__data
+
+		for edit in sorted(edits, reverse=True):
+			start, end, value	= edit[:3]
+			if len(edit) > 4:
+				number, column	= edit[3:5]
+			else:
+				offsets	= self.line_offsets()
+				number	= bisect.bisect_right(offsets, start) - 1
+				column	= start - offsets[number]
+			if number not in changed:
+				changed[number]	= bytearray(self.encoded_line(number))
+			changed[number][column:column + end - start]	= value
+			if data is not None:
+				data[start:end]	= value
+			resized	= resized or len(value) != end - start
+
+		numbers	= sorted(changed)
+		first	= 0
+		for i in range(1, len(numbers) + 1):
+			if i < len(numbers) and numbers[i] == numbers[i - 1] + 1:
+				continue
+			lines	= [bytes(changed[j]) for j in numbers[first:i]]
+			if self.__lines is not None:
+				self.__lines[numbers[first]:numbers[i - 1] + 1]	= lines
+			if len(lines) == 1:
+				self.buffer[numbers[first]]	= lines[0]
+			else:
+				self.buffer[numbers[first]:numbers[i - 1] + 1]	= lines
+			first	= i
+
+		self.__text	= None
+		if resized:
+			self.__offsets	= None
+
+	def substitute(self, changes):
+		"""
+		Return:		bool
+
+		Replaces characters by vim's :substitute, so buffer lines are
+		not copied to python. CHANGES are (line, column, old, new)
+		tuples: zero-leader LINE, byte COLUMN, OLD and NEW bytes of
+		the same length in self.encoding codec. A character, which
+		is not OLD anymore, is kept
+
+		Changes of the same characters on a line are joined into one
+		command, and the commands are run as a list by execute() in
+		one vim.command(), so it is one undo step (a command line
+		joined by "|" is parsed in quadratic time). Search pattern,
+		history and view of the window are kept
+		Returns False (nothing is changed), if the buffer is neither
+		current nor shown in some window
+		"""
+		groups	= {}
+		for line, column, old, new in changes:
+			if len(old) != len(new):
+				raise ValueError("substitute() keeps length of characters")
+			groups.setdefault((line + 1, old, new), []).append(column + 1)
+
+		flags		= "e" if int(vim.eval("&gdefault")) else "ge"
+		commands	= ["let g:yo_view = winsaveview()"]
+		for (line, old, new), columns in sorted(groups.items()):
+			old	= re.sub(r"[\\/]", r"\\\g<0>", old.decode(self.encoding))
+			new	= re.sub(r"[\\/&~]", r"\\\g<0>", new.decode(self.encoding))
+			pattern	= "\\|".join("\\%%%dc%s" % (column, old) for column in columns)
+			commands.append("keeppatterns %ds/\\V\\C%s/%s/%s" % (line, pattern, new, flags))
+		commands.append("call winrestview(g:yo_view)")
+		commands.append("unlet g:yo_view")
+		script	= "[%s]" % ", ".join("'%s'" % i.replace("'", "''") for i in commands)
+
+		number	= self.buffer.number
+		if vim.current.buffer.number == number:
+			vim.command("call execute(%s, '')" % script)
+		elif int(vim.eval("exists('*win_execute') && bufwinid(%d) != -1" % number)):
+			vim.command("call win_execute(bufwinid(%d), %s, '')" % (number, script))
+		else:
+			return False
+
+		self.__text	= None
+		self.__lines	= None
+		self.__data	= None
+		return True
+
 	#----string-like and sequence-like methods----
 
 	def __setitem__(self, key, value):
 		if not isinstance(value, (str, bytes)):
 			raise TypeError("__setitem__ method takes only str | bytes!")
+		text	= self.encoded()
+		size	= len(text)
 		if isinstance(key, int):
 			if key < 0:
-				key += len(self)
-			if key >= len(self) or key < 0:
+				key += size
+			if key >= size or key < 0:
 				raise IndexError
 			key = slice(key, key + 1)
 
 		try:
 			start	= key.start or 0
-			stop	= key.stop or {0:0, None:len(self)}[key.stop]
+			stop	= key.stop or {0:0, None:size}[key.stop]
 		except KeyError:
 			raise TypeError
 		if start < 0:
-			start += len(self)
+			start += size
 		if stop < 0:
-			stop += len(self)
+			stop += size
 
 		start	= max(start, 0)
 		stop	= max(stop, 0)
@@ -458,16 +758,24 @@ class Buffer:
 		if isinstance(value, str):
 			value		= value.encode(self.encoding)
 
-		self.text	= self.text.encode(self.encoding)[:start] + value +\
-					self.text.encode(self.encoding)[stop:]
-		self.text	= self.text.decode(self.encoding)
+		newline	= self.newlines.encode(self.encoding)
+		if len(value) == stop - start and newline not in value\
+				and newline not in text[start:stop]:
+			# the same length inside of one line: see patch()
+			self.patch([(start, stop, value)])
+			return
+
+		self.text	= (text[:start] + value + text[stop:]).decode(self.encoding)
 		self.py2vim()
 
 	def __delitem__(self, key):
 		"""
 		"""
+		if isinstance(key, slice):
+			self[key]	= b""
+			return
 		self.text	= self.text[:key] + self.text[key + 1:]
-		self.buffer[:]	= self.text.split(self.newlines)
+		self.py2vim()
 
 	def __getitem__(self, key):
 		return self.text[key]
@@ -689,21 +997,48 @@ class Buffer:
 		Return:		None
 
 		Applies FUNC to every (default) lines in buffer
-		"""
-		if len(pos) == 1:
-			R = range(pos[0])
-		elif len(pos) == 2:
-			R = range(pos[0], pos[1])
-		elif len(pos) == 3:
-			R = range(pos[0], pos[1], pos[2])
-		else:
-			R = range(len(self))
-		for i in R:
-			try:
-				self.buffer[i] = func(self.buffer[i])
-			except IndexError:
-				break
-		self.vim2py()
+		POS are arguments of range() for line numbers (zero-leader)
+
+		New lines are computed in one pass, only changed lines are
+		written into vim (by one slice for every run of changed
+		lines) and self.text is updated without reading vim
+		"""
+		numbers	= range(len(self.buffer))[slice(*pos) if pos else slice(None)]
+		if not numbers:
+			return
+		low	= min(numbers[0], numbers[-1])
+		high	= max(numbers[0], numbers[-1]) + 1
+		block	= self.buffer[low:high]
+
+		changed	= {}
+		for i in numbers:
+			old	= block[i - low]
+			new	= func(old)
+			if new != old:
+				changed[i]	= new
+		if not changed:
+			return
+
+		# write runs of consecutive changed lines by slices
+		runs	= []
+		for i in sorted(changed):
+			if runs and runs[-1][1] == i:
+				runs[-1][1]	= i + 1
+			else:
+				runs.append([i, i + 1])
+		for start, stop in runs:
+			self.buffer[start:stop]	= [changed[i] for i in range(start, stop)]
+
+		if self.__text is not None:
+			lines	= self.__text.split(self.newlines)
+			for i, line in changed.items():
+				lines[i]	= line
+			self.__text	= self.newlines.join(lines)
+		if self.__lines is not None:
+			for i, line in changed.items():
+				self.__lines[i]	= line.encode(self.encoding)
+		self.__offsets	= None
+		self.__data	= None
 
 	def center(self, width, *pos):
 		"""
@@ -882,7 +1217,13 @@ class Buffer:
 
 		Returns position in file
 		(byte-offset, zero-leader)
+
+		Position is kept inside of the object after seek() and
+		reading, until sync() moves vim's cursor there. Otherwise
+		it is vim's cursor position
 		"""
+		if self.__pos is not None:
+			return self.__pos
 		line	= int(vim.eval("line('.')"))
 		column	= int(vim.eval("col('.')"))
 		return self.LC2offset(line, column)
@@ -895,20 +1236,29 @@ class Buffer:
 		whence == 0	-> movement relative to the start of file
 		whence == 1	-> movement relative to current position
 		whence == 2	-> movemetn relative to the end of file
+
+		Vim's cursor is not moved until sync() is called
 		"""
 		if whence == 0:
-			vim.eval("cursor(%d, %d)" % self.offset2LC(offset))
+			pos	= offset
 		elif whence == 1:
-			line		= int(vim.eval("line('.')"))
-			column		= int(vim.eval("col('.')"))
-			current_offset	= self.LC2offset(line, column)
-			vim.eval("cursor(%d,%d)" % self.offset2LC(current_offset + offset))
+			pos	= self.tell() + offset
 		elif whence == 2:
-			line		= int(vim.eval("line('$')"))
-			column		= int(vim.eval("col('$')"))
-			vim.eval("cursor(%d,%d)" % self.offset2LC(len(self) - offset))
+			pos	= self.size() - offset
 		else:
 			raise TypeError("Second argument seek() method must be 0, 1 or 2")
+		self.__pos	= min(max(pos, 0), self.size())
+
+	def sync(self):
+		"""
+		Return:		None
+
+		Moves vim's cursor to the position of seek() and reading
+		After that tell() follows vim's cursor again
+		"""
+		if self.__pos is not None:
+			vim.eval("cursor(%d, %d)" % self.offset2LC(self.__pos))
+			self.__pos	= None
 
 	def truncate(self, size=None):
 		"""
@@ -928,14 +1278,15 @@ class Buffer:
 		If SIZE is negative, then reads all till
 		the end of a file
 		"""
-		pos = self.tell()
-		
+		pos	= self.tell()
+		data	= self.encoded()
+
 		if size >= 0:
-			self.seek(size, 1)
-			return str(self.encode(self.encoding)[pos:pos + size])
+			result	= data[pos:pos + size]
 		else:
-			self.seek(0,2)
-			return str(self.encode(self.encoding)[pos:])
+			result	= data[pos:]
+		self.__pos	= pos + len(result)
+		return result.decode(self.encoding, "ignore")
 
 	def readline(self, size=-1):
 		"""
@@ -945,18 +1296,17 @@ class Buffer:
 		Newline char is kept in string
 		"""
 		pos		= self.tell()
-		text		= self.encode(self.encoding)
+		data		= self.encoded()
 		newlines	= self.newlines.encode(self.encoding)
-		try:
-			result	= text[pos: text.index(newlines, pos)] + newlines
-		except ValueError:
-			result	= text[pos:]
-		if size >= 0:
-			self.seek(pos + size, 0)
-			return result[:size].decode(self.encoding)
+		end		= data.find(newlines, pos)
+		if end == -1:
+			end	= len(data)
 		else:
-			self.seek(pos + len(result))
-			return result.decode(self.encoding)
+			end	+= len(newlines)
+		if size >= 0:
+			end	= min(end, pos + size)
+		self.__pos	= end
+		return data[pos:end].decode(self.encoding, "ignore")
 
 	def readlines(self, sizehint=0):
 		"""
@@ -970,10 +1320,6 @@ class Buffer:
 
 		while line:
 			lines.append(line)
-
-			if int(vim.eval("line('.')")) == int(vim.eval("line('$')")):
-				lines.append(self.readline())
-				break
 			total += len(line)
 			if 0 < sizehint <= total:
 				break
@@ -992,7 +1338,7 @@ class Buffer:
 		string = re.sub(r"\r\n?|\n", self.newlines, string)
 		pos		= self.tell()
 		self[pos:pos]	= string
-		self.seek(pos + len(string))
+		self.seek(pos + len(string.encode(self.encoding)))
 
 	def writelines(self, array):
 		"""
@@ -0,0 +1,193 @@
+"""
+Context model for words, which optionally may be written with YO
+
+The model is a pair of hashed count tables (arrays of unsigned shorts):
+how many times a feature was seen with 'ё' and how many times with 'е'.
+Features are the word itself and the word together with its left and
+right neighbours. Tables are trained once from texts, which are already
+written with 'ё', and stored in a compact binary file next to yo.txt
+
+This module does not need vim, so model can be trained from the shell:
+
+	python3 context.py yo.txt yo.ctx corpus1.txt [corpus2.txt ...]
+"""
+import array, math, re, sys, zlib
+
+#----GLOBAL VARS----
+
+MAGIC		= b"YOCTX1"
+TABLE_BITS	= 18
+COUNT_MAX	= 0xffff
+
+WORD		= re.compile(r"[^\s\.\,\"\'\-\:\\\/\<\>\;\(\)\!\?\_\[\]]+")
+
+#----AUXILLIARY FUNCS----
+
+def _feature(key, tag, word):
+	return ("%s\x00%s\x00%s" % (key, tag, word)).encode("utf-8")
+
+def neighbours(text, start, end, window=64):
+	"""
+	Return:		tuple
+
+	Returns pair (previous word, next word) around TEXT[START:END]
+	in lower case. Missing neighbour is an empty string
+	"""
+	left	= WORD.findall(text, max(start - window, 0), start)
+	right	= WORD.search(text, end, end + window)
+	return (left[-1].lower() if left else "",
+		right.group().lower() if right else "")
+
+#----CONTEXTMODEL----
+
+class ContextModel:
+	"""
+	Scores optional YO candidates by their neighbouring words
+
+	instance.yo		counts of features seen with 'ё'
+	instance.ye		counts of features seen with 'е'
+	instance.bits		log2 of table size
+	instance.alpha		additive smoothing constant
+	"""
+	def __init__(self, bits=TABLE_BITS, alpha=0.5):
+		self.bits	= bits
+		self.mask	= (1 << bits) - 1
+		self.alpha	= alpha
+		self.yo		= array.array("H", bytes(2 << bits))
+		self.ye		= array.array("H", bytes(2 << bits))
+
+	#----persistence----
+
+	@classmethod
+	def load(cls, path):
+		"""
+		Return:		ContextModel
+
+		Reads model from binary file PATH
+		"""
+		with open(path, "rb") as file:
+			if file.read(len(MAGIC)) != MAGIC:
+				raise ValueError("%s is not a context model file" % path)
+			model	= cls(file.read(1)[0])
+			model.yo	= array.array("H")
+			model.ye	= array.array("H")
+			model.yo.fromfile(file, 1 << model.bits)
+			model.ye.fromfile(file, 1 << model.bits)
+		return model
+
+	def save(self, path):
+		"""
+		Return:		None
+
+		Writes model into binary file PATH
+		"""
+		with open(path, "wb") as file:
+			file.write(MAGIC + bytes([self.bits]))
+			self.yo.tofile(file)
+			self.ye.tofile(file)
+
+	#----training----
+
+	def __add(self, feature, is_yo):
+		table	= self.yo if is_yo else self.ye
+		slot	= zlib.crc32(feature) & self.mask
+		if table[slot] < COUNT_MAX:
+			table[slot] += 1
+
+	def train(self, text, optional):
+		"""
+		Return:		int
+
+		Counts every word of TEXT, which is a key (or a value) of
+		OPTIONAL dictionary. Returns number of counted words
+		"""
+		words	= [i.lower() for i in WORD.findall(text)]
+		counter	= 0
+		for i, word in enumerate(words):
+			key	= word.replace("ё", "е")
+			if key not in optional:
+				continue
+			is_yo	= word != key
+			prev	= words[i - 1] if i else ""
+			next	= words[i + 1] if i + 1 < len(words) else ""
+			self.__add(_feature(key, "", ""), is_yo)
+			self.__add(_feature(key, "<", prev), is_yo)
+			self.__add(_feature(key, ">", next), is_yo)
+			counter += 1
+		return counter
+
+	#----scoring----
+
+	def __log_odds(self, feature):
+		slot	= zlib.crc32(feature) & self.mask
+		yo, ye	= self.yo[slot], self.ye[slot]
+		if not yo and not ye:
+			return None
+		return math.log((yo + self.alpha) / (ye + self.alpha))
+
+	def score(self, key, prev="", next=""):
+		"""
+		Return:		float | None
+
+		Returns probability of 'ё' in the word KEY (written with 'е',
+		lower case) between words PREV and NEXT
+		If the word was never seen in training, returns None
+		"""
+		prior	= self.__log_odds(_feature(key, "", ""))
+		if prior is None:
+			return None
+		result	= prior
+		for i in (_feature(key, "<", prev), _feature(key, ">", next)):
+			odds	= self.__log_odds(i)
+			if odds is not None:
+				result += odds - prior
+		if result > 30:
+			return 1.0
+		if result < -30:
+			return 0.0
+		return 1.0 / (1.0 + math.exp(-result))
+
+	def classify(self, items, threshold=0.95):
+		"""
+		Return:		tuple
+
+		Takes iterable of (key, prev, next) triples and returns three
+		lists of their indexes: (surely 'ё', surely 'е', uncertain)
+		Uncertain indexes are sorted from the most doubtful one
+		"""
+		yo, ye, rest	= [], [], []
+		for i, (key, prev, next) in enumerate(items):
+			p	= self.score(key, prev, next)
+			if p is None:
+				rest.append((0.0, i))
+			elif p >= threshold:
+				yo.append(i)
+			elif p <= 1.0 - threshold:
+				ye.append(i)
+			else:
+				rest.append((abs(p - 0.5), i))
+		rest.sort()
+		return yo, ye, [i for p, i in rest]
+
+def main(argv=sys.argv):
+	if len(argv) < 4:
+		print("Usage: %s yo.txt model.ctx corpus.txt [corpus.txt ...]" % argv[0])
+		return 1
+
+	optional	= set()
+	with open(argv[1], "r", encoding="utf-8") as file:
+		for i in file:
+			if i.startswith("*"):
+				optional.add(i[2:].replace("ё", "е").strip())
+
+	model	= ContextModel()
+	counter	= 0
+	for path in argv[3:]:
+		with open(path, "r", encoding="utf-8") as file:
+			counter += model.train(file.read(), optional)
+	model.save(argv[2])
+	print("%d optional words counted, model written to %s" % (counter, argv[2]))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,470 @@
+"""
+Encoding-native scanner for words, written without YO
+
+ByteEngine searches candidates directly in the encoded buffer contents
+(bytes in vim's &encoding) and builds replacements in the same encoding,
+so neither the buffer nor matched words have to be decoded
+
+	single-byte codecs (cp1251, koi8-r, ...)	-> byte patterns and
+							translate() tables
+	utf-8						-> byte patterns, only
+							matched words are decoded
+	other codecs					-> decoding fallback
+
+Very large texts may be scanned by line-aligned shards on a pool
+of forked processes (see parallel_scan())
+
+This module does not need vim
+"""
+import re, os, array, multiprocessing
+
+#----GLOBAL VARS----
+
+SEPARATORS	= "\t\n\v\f\r .,\"'-:\\/<>;()!?_[]"
+
+# non-ASCII spaces (NBSP, thin spaces, ...), which separate words
+# like \s of str patterns
+SPACES		= "".join(chr(i) for i in range(0x80, 0x3001) if chr(i).isspace())
+
+# (engine, data, skip, shift) of running parallel_scan(), inherited by forked workers
+_shared		= None
+
+# kinds of candidates by dictionary
+KINDS		= ("necessary", "optional")
+
+#----AUXILLIARY FUNCS----
+
+def _single_byte(encoding):
+	try:
+		return len("ёЁеЕ".encode(encoding)) == 4 and len("a".encode(encoding)) == 1
+	except (UnicodeEncodeError, LookupError):
+		return False
+
+def _is_utf8(encoding):
+	return encoding.lower().replace("_", "-") in ("utf-8", "utf8")
+
+def _encode_table(table, encoding):
+	if not isinstance(table, dict):
+		# tables with their own storage (see tiered.py)
+		return table.encoded(encoding)
+	result	= {}
+	for key, value in table.items():
+		try:
+			result[key.encode(encoding)] = value.encode(encoding)
+		except UnicodeEncodeError:
+			pass
+	return result
+
+#----BYTEENGINE----
+
+class ByteEngine:
+	"""
+	Scans and patches bytes in ENCODING codec
+
+	instance.encoding	codec of scanned data
+	instance.pattern	compiled bytes pattern of candidates
+	instance.tables		encoded dictionaries by name
+				('optional', 'necessary')
+	"""
+	def __init__(self, encoding, **tables):
+		self.encoding	= encoding
+		self.tables	= dict((name, _encode_table(table, encoding))
+					for name, table in tables.items())
+
+		try:
+			self.ye		= "е".encode(encoding)
+			self.ye_upper	= "Е".encode(encoding)
+			self.yo		= "ё".encode(encoding)
+			self.yo_upper	= "Ё".encode(encoding)
+		except UnicodeEncodeError:
+			# codec without cyrillic (latin1, ...): decoded text has
+			# no 'е', so the decoding fallback finds nothing
+			self.ye = self.ye_upper = self.yo = self.yo_upper = None
+
+		separators	= SEPARATORS.encode("ascii")
+		spaces		= []
+		for i in SPACES:
+			try:
+				spaces.append(i.encode(encoding))
+			except UnicodeEncodeError:
+				pass
+		# spaces longer than a byte split found words (see __finditer())
+		self.spaces	= None
+		if self.ye is None:
+			self.mode	= "decode"
+			center	= b""
+		elif _single_byte(encoding):
+			self.mode	= "single"
+			separators += b"".join(i for i in spaces if len(i) == 1)
+			lower	= bytearray(range(256))
+			for i in range(256):
+				try:
+					char	= bytes([i]).decode(encoding).lower().encode(encoding)
+				except (UnicodeDecodeError, UnicodeEncodeError):
+					continue
+				if len(char) == 1:
+					lower[i] = char[0]
+			self.__lower	= bytes(lower)
+			center	= b"[" + re.escape(self.ye + self.ye_upper) + b"]"
+		elif _is_utf8(encoding):
+			self.mode	= "utf-8"
+			center	= b"(?:" + re.escape(self.ye) + b"|" + re.escape(self.ye_upper) + b")"
+			self.spaces	= re.compile(b"|".join(re.escape(i) for i in spaces))
+		else:
+			self.mode	= "decode"
+			center	= b""
+
+		side		= b"[^" + re.escape(separators) + b"]*"
+		self.pattern	= re.compile(side + center + side)
+		self.word	= re.compile(b"[^" + re.escape(separators) + b"]+")
+
+	#----dictionary updates----
+
+	def add(self, table, key, word):
+		"""
+		Return:		None
+
+		Adds KEY -> WORD entry to the TABLE dictionary
+		"""
+		try:
+			self.tables[table][key.encode(self.encoding)] = word.encode(self.encoding)
+		except UnicodeEncodeError:
+			pass
+
+	def remove(self, table, key):
+		"""
+		Return:		None
+
+		Removes KEY entry from the TABLE dictionary
+		"""
+		try:
+			self.tables[table].pop(key.encode(self.encoding), None)
+		except UnicodeEncodeError:
+			pass
+
+	#----auxilliary methods----
+
+	def lower(self, token):
+		"""
+		Return:		bytes
+
+		Returns TOKEN in lower case
+		"""
+		if self.mode == "single":
+			return token.translate(self.__lower)
+		# invalid bytes are kept as they are, so they never match
+		return token.decode(self.encoding, "surrogateescape").lower().encode(
+				self.encoding, "surrogateescape")
+
+	def __pieces(self, token):
+		# (start, end) of parts of TOKEN between multibyte spaces
+		start	= 0
+		for i in self.spaces.finditer(token):
+			if i.start() > start:
+				yield start, i.start()
+			start	= i.end()
+		if start < len(token):
+			yield start, len(token)
+
+	def __finditer(self, data, pos, endpos):
+		if self.mode != "decode":
+			spaces	= self.spaces
+			for i in self.pattern.finditer(data, pos, endpos):
+				token	= i.group()
+				if spaces is None or spaces.search(token) is None:
+					yield i.start(), i.end(), token
+					continue
+				for start, end in self.__pieces(token):
+					piece	= token[start:end]
+					if self.ye in piece or self.ye_upper in piece:
+						yield i.start() + start, i.start() + end, piece
+			return
+
+		# codec without stable byte patterns: decode and count offsets
+		text	= data[pos:endpos].decode(self.encoding, "surrogateescape")
+		side	= "[^\\s" + re.escape(SEPARATORS) + "]*"
+		prev	= (0, pos)
+		for i in re.finditer(side + "[еЕ]" + side, text):
+			start	= prev[1] + len(text[prev[0]:i.start()].encode(
+					self.encoding, "surrogateescape"))
+			token	= i.group().encode(self.encoding, "surrogateescape")
+			prev	= (i.end(), start + len(token))
+			yield start, prev[1], token
+
+	#----scanning----
+
+	def scan(self, data, table, pos=0, endpos=None, skip=None, shift=0):
+		"""
+		Return:		list
+
+		Returns list of (start, end, replacement) triples for every
+		word of DATA[POS:ENDPOS], which is found in the TABLE dictionary
+		START and END are byte offsets, REPLACEMENT is the encoded word
+		with YO in the case of the original one
+
+		Words, for which SKIP(START + SHIFT, END + SHIFT) is true, are
+		dropped before dictionary lookup (see regions.RegionIndex)
+		"""
+		if endpos is None:
+			endpos	= len(data)
+		get	= self.tables[table].get
+		lower	= self.lower
+		fix	= self.fix
+		result	= []
+		for start, end, token in self.__finditer(data, pos, endpos):
+			if skip is not None and skip(start + shift, end + shift):
+				continue
+			value	= get(token)
+			if value is None:
+				value	= get(lower(token))
+			if value is not None:
+				result.append((start, end, fix(token, value)))
+		return result
+
+	def vocabulary(self, data, pos=0, endpos=None):
+		"""
+		Return:		set
+
+		Returns decoded words of DATA[POS:ENDPOS], which may be
+		candidates, in lower case
+		"""
+		if endpos is None:
+			endpos	= len(data)
+		tokens	= set(i[2] for i in self.__finditer(data, pos, endpos))
+		return set(i.decode(self.encoding, "ignore").lower() for i in tokens)
+
+	def scan_lines(self, lines, table, newline=1, offset=0, skip=None):
+		"""
+		Return:		generator
+
+		Takes iterable of (number, bytes) LINES, which follow one
+		another and the first of them starts at byte OFFSET
+		Yields (start, end, replacement, line, column) tuples, where
+		START and END are byte offsets in the whole text joined by
+		NEWLINE bytes long separator
+		SKIP takes these offsets (see scan())
+		"""
+		for number, line in lines:
+			for start, end, replacement in self.scan(line, table,
+					skip=skip, shift=offset):
+				yield (offset + start, offset + end, replacement,
+					number, start)
+			offset += len(line) + newline
+
+	def neighbours(self, data, start, end, window=64, lo=0, hi=None):
+		"""
+		Return:		tuple
+
+		Returns pair of decoded (previous word, next word) around
+		DATA[START:END] in lower case
+		Words are looked for in DATA[LO:HI] only (a paragraph of
+		DATA), so DATA is not copied
+		"""
+		if hi is None:
+			hi	= len(data)
+		left	= self.word.findall(data, max(start - window, lo), start)
+		right	= self.word.findall(data, end, min(end + window, hi))[:1]
+		if self.spaces is not None:
+			left	= [j for i in left[-1:] for j in self.spaces.split(i) if j]
+			right	= [j for i in right for j in self.spaces.split(i) if j]
+		return (left[-1].decode(self.encoding, "ignore").lower() if left else "",
+			right[0].decode(self.encoding, "ignore").lower() if right else "")
+
+	#----patching----
+
+	def fix(self, token, value):
+		"""
+		Return:		bytes
+
+		Returns TOKEN with 'е' replaced by 'ё' in the places, where
+		dictionary VALUE has it. Case of TOKEN is kept as is
+		"""
+		if len(token) != len(value):
+			return value
+		result	= bytearray(token)
+		width	= len(self.yo)
+		pos	= value.find(self.yo)
+		while pos != -1:
+			if token[pos:pos + width] == self.ye_upper:
+				result[pos:pos + width] = self.yo_upper
+			else:
+				result[pos:pos + width] = self.yo
+			pos	= value.find(self.yo, pos + width)
+		return bytes(result)
+
+	def patch(self, data, edits):
+		"""
+		Return:		bytes
+
+		Applies (start, end, replacement, ...) EDITS to DATA
+		"""
+		result	= bytearray(data)
+		for edit in sorted(edits, reverse=True):
+			result[edit[0]:edit[1]] = edit[2]
+		return bytes(result)
+
+#----CANDIDATES----
+
+class Candidate:
+	"""
+	One candidate of Candidates (see Candidates.__getitem__())
+
+	instance.offset		byte offset in the text
+	instance.length		length in bytes
+	instance.line		zero-based line number
+	instance.column		zero-based byte column
+	instance.kind		index of the dictionary name in KINDS
+	instance.word		index of the replacement in Candidates.words
+	"""
+	__slots__	= ("offset", "length", "line", "column", "kind", "word")
+
+	def __init__(self, offset, length, line, column, kind, word):
+		self.offset	= offset
+		self.length	= length
+		self.line	= line
+		self.column	= column
+		self.kind	= kind
+		self.word	= word
+
+	def __repr__(self):
+		return "Candidate(%d, %d, %d, %d, %d, %d)" % (self.offset, self.length,
+				self.line, self.column, self.kind, self.word)
+
+class Candidates:
+	"""
+	Compact set of candidates: parallel arrays of numbers
+	Every distinct replacement is stored once in instance.words
+
+	instance.offsets	byte offsets in the text
+	instance.lengths	lengths in bytes
+	instance.lines		zero-based line numbers
+	instance.columns	zero-based byte columns
+	instance.kinds		indexes of dictionary names in KINDS
+	instance.ids		indexes of replacements in instance.words
+	instance.words		encoded replacements
+	"""
+	def __init__(self):
+		self.offsets	= array.array("q")
+		self.lengths	= array.array("l")
+		self.lines	= array.array("q")
+		self.columns	= array.array("l")
+		self.kinds	= array.array("b")
+		self.ids	= array.array("l")
+		self.words	= []
+		self.__words	= {}
+
+	def __len__(self):
+		return len(self.offsets)
+
+	def __getitem__(self, i):
+		return Candidate(self.offsets[i], self.lengths[i], self.lines[i],
+				self.columns[i], self.kinds[i], self.ids[i])
+
+	def __iter__(self):
+		for i in range(len(self)):
+			yield self[i]
+
+	def extend(self, matches, kind):
+		"""
+		Return:		None
+
+		Adds (start, end, replacement, line, column) MATCHES, which
+		were found in the KIND dictionary ('necessary', 'optional')
+		"""
+		kind	= KINDS.index(kind)
+		words	= self.__words
+		for start, end, replacement, line, column in matches:
+			word	= words.get(replacement)
+			if word is None:
+				word	= words[replacement] = len(self.words)
+				self.words.append(replacement)
+			self.offsets.append(start)
+			self.lengths.append(end - start)
+			self.lines.append(line)
+			self.columns.append(column)
+			self.kinds.append(kind)
+			self.ids.append(word)
+
+	def replacement(self, i):
+		"""
+		Return:		bytes
+
+		Returns encoded replacement of I-th candidate
+		"""
+		return self.words[self.ids[i]]
+
+	def tuples(self, kind=None):
+		"""
+		Return:		list
+
+		Returns (start, end, replacement, line, column) tuples of
+		candidates (of the KIND dictionary only, if given), as
+		Buffer.patch() takes them
+		"""
+		kind	= None if kind is None else KINDS.index(kind)
+		return [(self.offsets[i], self.offsets[i] + self.lengths[i],
+			self.words[self.ids[i]], self.lines[i], self.columns[i])
+			for i in range(len(self)) if kind is None or self.kinds[i] == kind]
+
+#----PARALLEL SCANNING----
+
+def _scan_shard(args):
+	# results are packed into arrays and one bytes object: it is
+	# much cheaper to send them back than a list of tuples
+	scanner, data, skip, shift	= _shared
+	table, start, end	= args
+	matches	= scanner.scan(data, table, start, end, skip, shift)
+	return (array.array("q", [i[0] for i in matches]),
+		array.array("q", [i[1] for i in matches]),
+		array.array("l", [len(i[2]) for i in matches]),
+		b"".join([i[2] for i in matches]))
+
+def shards(data, count, newline=b"\n"):
+	"""
+	Return:		list
+
+	Splits DATA into about COUNT (start, end) pairs, which
+	begin at the beginnings of lines
+	"""
+	size	= len(data) // max(count, 1) + 1
+	result	= []
+	start	= 0
+	while start < len(data):
+		end	= data.find(newline, start + size)
+		end	= len(data) if end == -1 else end + len(newline)
+		result.append((start, end))
+		start	= end
+	return result
+
+def parallel_scan(scanner, data, table, workers=None, newline=b"\n", skip=None, shift=0):
+	"""
+	Return:		list
+
+	Works as SCANNER.scan(DATA, TABLE), but scans shards of DATA
+	on WORKERS processes (all cores by default). Workers are forked,
+	so they share the dictionary and DATA with this process without
+	copying. Results are merged in the order of DATA
+	Without fork() or with one worker, DATA is scanned here
+	SKIP and SHIFT work as in scan()
+	"""
+	global _shared
+
+	workers	= workers or os.cpu_count() or 1
+	if workers < 2 or scanner.mode == "decode" or not hasattr(os, "fork"):
+		return scanner.scan(data, table, skip=skip, shift=shift)
+
+	jobs	= [(table, start, end) for start, end in shards(data, workers * 4, newline)]
+	_shared	= (scanner, data, skip, shift)
+	try:
+		with multiprocessing.get_context("fork").Pool(workers) as pool:
+			parts	= pool.map(_scan_shard, jobs)
+	finally:
+		_shared	= None
+
+	result	= []
+	for starts, ends, lengths, replacements in parts:
+		pos	= 0
+		for start, end, length in zip(starts, ends, lengths):
+			result.append((start, end, replacements[pos:pos + length]))
+			pos += length
+	return result
@@ -11,11 +11,104 @@ import sys, vim
 sys.path.append(vim.eval("g:vim_yo_path"))
 EOF
 
-function! g:CorrectYo()
+function! g:CorrectYo(...)
 python3 << EOF
 import spellchecker
-spellchecker.main()
+spellchecker.main(*[int(i) for i in vim.eval("a:000")])
 EOF
 
 endfunction
+function! g:CorrectYoAll(...)
+python3 << EOF
+import spellchecker
+spellchecker.main_all(*vim.eval("a:000"))
+EOF
+
+endfunction
+function! g:ReviewYo(...)
+python3 << EOF
+import spellchecker
+spellchecker.main_review(*[int(i) for i in vim.eval("a:000")])
+EOF
+
+endfunction
+function! g:GroupYo(...)
+python3 << EOF
+import spellchecker
+spellchecker.main_group(*[int(i) for i in vim.eval("a:000")])
+EOF
+
+endfunction
+function! g:YoApply()
+python3 << EOF
+import spellchecker
+spellchecker.apply_review()
+EOF
+
+endfunction
+function! g:SpellYo()
+python3 << EOF
+import spellchecker
+spellchecker.main_spell()
+EOF
+
+endfunction
+function! g:StatsYo()
+python3 << EOF
+import spellchecker
+spellchecker.main_stats()
+EOF
+
+endfunction
+function! g:CalibrateYo()
+python3 << EOF
+import spellchecker
+spellchecker.main_calibrate()
+EOF
+
+endfunction
+function! g:ForgetYo(number)
+python3 << EOF
+import spellchecker
+spellchecker.forget(int(vim.eval("a:number")))
+EOF
+
+endfunction
+function! g:YoPopupCallback(id, result)
+python3 << EOF
+import spellchecker
+spellchecker.popup_callback(int(vim.eval("a:result")))
+EOF
+
+endfunction
+function! g:YoScanStep(timer)
+python3 << EOF
+import spellchecker
+spellchecker.scan_step()
+EOF
+
+endfunction
+function! g:PollYo(timer)
+python3 << EOF
+import spellchecker
+spellchecker.poll()
+EOF
+
+endfunction
+if has('timers')
+	call timer_start(get(g:, 'vim_yo_poll', 5000), 'g:PollYo', {'repeat': -1})
+endif
+augroup vim_yo
+	autocmd!
+	autocmd BufWipeout * call g:ForgetYo(str2nr(expand('<abuf>')))
+augroup END
+
+command! -range=% YoCheck call g:CorrectYo(<line1>, <line2>)
+command! -nargs=* -complete=file YoCheckAll call g:CorrectYoAll(<f-args>)
+command! -range=% YoReview call g:ReviewYo(<line1>, <line2>)
+command! -range=% YoGroup call g:GroupYo(<line1>, <line2>)
+command! YoSpell call g:SpellYo()
+command! YoStats call g:StatsYo()
+command! YoCalibrate call g:CalibrateYo()
 nnoremap <Leader>yo :call g:CorrectYo() <CR>
+vnoremap <Leader>yo :YoCheck<CR>
@@ -0,0 +1,181 @@
+"""
+Protected regions of text, which must not be checked
+
+Lexers go through encoded lines once and collect byte spans of code
+blocks, URLs, identifiers, markup commands and comments. Spans are kept
+in RegionIndex, which answers whether a word touches any of them by
+binary search, so protected words are dropped before dictionary lookup
+
+All patterns are ASCII bytes: they work for single-byte codecs and
+utf-8 without decoding
+
+This module does not need vim
+"""
+import re, array, bisect
+
+#----GLOBAL VARS----
+
+SEPARATORS	= rb"\s.,\"'\-:\\/<>;()!?\[\]"
+
+COMMON		= [
+	rb"(?:https?|ftp|file)://[^\s<>\"'()\[\]]+",
+	rb"\bwww\.[^\s<>\"'()\[\]]+",
+	rb"[^\s@<>\"'()\[\]]+@[^\s@<>\"'()\[\]]+\.[A-Za-z]+",
+	# snake_case identifiers: '_' is a separator of words otherwise,
+	# so it must have a letter or a digit on both sides ('_еще_' and
+	# 'еще__' are emphasis, not code); bytes above 0x7f are letters of
+	# utf-8 and single-byte codecs
+	rb"[A-Za-z0-9\x80-\xff]+(?:_[A-Za-z0-9\x80-\xff]+)+",
+]
+
+MARKDOWN	= [
+	rb"`[^`]*`",
+	rb"\]\([^)]*\)",
+	rb"</?[A-Za-z][^>]*>",
+]
+
+TEX		= [
+	rb"(?<!\\)%.*",
+	rb"\\(?:label|ref|eqref|pageref|cite[a-z]*|input|include|usepackage|"\
+		rb"documentclass|url|href|begin|end)\*?(?:\[[^\]]*\])?\{[^}]*\}",
+	rb"\\[A-Za-z@]+",
+	rb"\$\$.*?\$\$|(?<!\\)\$.*?(?<!\\)\$",
+	rb"\\\(.*?\\\)|\\\[.*?\\\]",
+]
+
+# comment leaders of source files
+COMMENTS	= {
+	b"#"	: ("python", "sh", "bash", "zsh", "ruby", "perl", "yaml", "toml",
+			"conf", "make", "cmake", "r", "awk", "dockerfile"),
+	b"//"	: ("c", "cpp", "cs", "java", "javascript", "typescript", "go",
+			"rust", "kotlin", "swift", "scala", "php", "dart"),
+	b"--"	: ("lua", "sql", "haskell", "ada"),
+	b"\""	: ("vim",),
+	b";"	: ("lisp", "scheme", "clojure", "asm"),
+}
+
+VERBATIM	= rb"verbatim|lstlisting|minted|comment|equation\*?|align\*?|"\
+			rb"gather\*?|multline\*?|displaymath|math"
+
+#----REGIONINDEX----
+
+class RegionIndex:
+	"""
+	Sorted, non-overlapping byte spans
+
+	instance.starts		array of span beginnings
+	instance.ends		array of span ends
+	"""
+	def __init__(self):
+		self.starts	= array.array("q")
+		self.ends	= array.array("q")
+
+	def __len__(self):
+		return len(self.starts)
+
+	def add(self, start, end):
+		"""
+		Return:		None
+
+		Adds span [START, END). Spans must be added in order
+		"""
+		if self.ends and start <= self.ends[-1]:
+			self.ends[-1]	= max(self.ends[-1], end)
+		else:
+			self.starts.append(start)
+			self.ends.append(end)
+
+	def protects(self, start, end):
+		"""
+		Return:		bool
+
+		Returns True, if [START, END) touches any span
+		"""
+		i	= bisect.bisect_right(self.starts, end - 1) - 1
+		return i >= 0 and self.ends[i] > start
+
+#----LEXERS----
+
+class Lexer:
+	"""
+	Finds protected spans in lines of some filetype
+	Filetypes with blocks, which are longer than one line (fenced code
+	in Markdown, verbatim environments in TeX, block comments in C),
+	keep their state between lines
+	"""
+	def __init__(self, patterns, comment=None, block=None):
+		if comment:
+			patterns = patterns + [re.escape(comment) + rb".*"]
+		self.inline	= re.compile(b"|".join(patterns))
+		self.block	= block
+		self.inside	= None
+
+	def line(self, data):
+		"""
+		Return:		list
+
+		Returns (start, end) spans of DATA (one line)
+		"""
+		if self.block:
+			opened, closed	= self.block
+			if self.inside is not None:
+				match	= closed(self.inside).search(data)
+				if not match:
+					return [(0, len(data))]
+				self.inside	= None
+				return [(0, match.end())] + self.__inline(data, match.end())
+			match	= opened.search(data)
+			if match:
+				self.inside	= match.group(1)
+				rest		= closed(self.inside).search(data, match.end())
+				if rest:
+					self.inside	= None
+					return self.__inline(data, 0, match.start()) +\
+						[(match.start(), rest.end())] +\
+						self.__inline(data, rest.end())
+				return self.__inline(data, 0, match.start()) + [(match.start(), len(data))]
+		return self.__inline(data, 0)
+
+	def __inline(self, data, pos, endpos=None):
+		if endpos is None:
+			endpos	= len(data)
+		return [i.span() for i in self.inline.finditer(data, pos, endpos) if i.end() > i.start()]
+
+def lexer(filetype):
+	"""
+	Return:		Lexer | None
+
+	Returns lexer for FILETYPE (vim's &filetype)
+	Plain text files get a lexer for URLs and identifiers only
+	"""
+	if filetype in ("markdown", "pandoc", "rmd", "vimwiki"):
+		return Lexer(COMMON + MARKDOWN, block=(
+			re.compile(rb"^\s*(```+|~~~+)"),
+			lambda fence: re.compile(rb"^\s*" + re.escape(fence))))
+	if filetype in ("tex", "plaintex", "latex", "context"):
+		return Lexer(COMMON + TEX, block=(
+			re.compile(rb"\\begin\{(" + VERBATIM + rb")\}"),
+			lambda name: re.compile(rb"\\end\{" + re.escape(name) + rb"\}")))
+	for comment, filetypes in COMMENTS.items():
+		if filetype in filetypes:
+			block	= None
+			if comment == b"//":
+				block	= (re.compile(rb"(/\*)"), lambda leader: re.compile(rb"\*/"))
+			return Lexer(COMMON, comment, block)
+	return Lexer(COMMON)
+
+def index(filetype, lines, newline=1, offset=0):
+	"""
+	Return:		RegionIndex
+
+	Takes iterable of (number, bytes) LINES, which follow one
+	another and the first of them starts at byte OFFSET, and
+	returns index of their protected spans
+	"""
+	result	= RegionIndex()
+	scanner	= lexer(filetype)
+	for number, line in lines:
+		for start, end in scanner.line(line):
+			result.add(offset + start, offset + end)
+		offset += len(line) + newline
+	return result
@@ -0,0 +1,485 @@
+"""
+Service mode: words without YO are corrected in texts, posted over HTTP
+
+	python3 server.py yo.txt [--host 127.0.0.1] [--port 8765] [options]
+
+	POST /correct	{"text": "...", "filetype": "markdown"}
+			-> {"text": "...", "words": 2}
+			{"texts": ["...", ...]}
+			-> {"texts": ["...", ...], "words": [2, ...]}
+	GET /stats	-> counters of the service
+
+The dictionary is read once and stays in memory. Texts of concurrent
+requests are coalesced: they wait in one queue, and while a batch is
+corrected (in a thread, so requests are still accepted), the next one
+is gathered. Every batch is corrected by one call of
+watch.Corrector.correct_many(): equal texts are corrected once, known
+paragraphs are taken from cache, and optional words of the batch are
+scored by context model (yo.ctx next to yo.txt) at once
+
+/stats reports number of requests, texts and batches, throughput and
+percentiles of latency of the last SAMPLES requests
+
+The service is load-tested by
+
+	python3 server.py --load corpus.txt [--clients 32] [--seconds 10]
+
+which sends pieces of CORPUS from CLIENTS connections to the running
+service and reports throughput and latency, as clients see them
+
+This module does not need vim
+"""
+import sys, time, json, random, signal, asyncio, argparse
+from collections import deque
+
+import watch
+
+#----GLOBAL VARS----
+
+HOST		= "127.0.0.1"
+PORT		= 8765
+
+# seconds to wait for more texts, before a batch is started
+WINDOW		= 0.001
+BATCH		= 256
+MAX_BODY	= 1 << 20
+SAMPLES		= 10000
+
+REASONS		= {
+	200	: "OK",
+	400	: "Bad Request",
+	404	: "Not Found",
+	405	: "Method Not Allowed",
+	413	: "Payload Too Large",
+	500	: "Internal Server Error",
+}
+
+#----AUXILLIARY FUNCS----
+
+def _percentile(values, fraction):
+	# nearest-rank percentile of sorted VALUES
+	if not values:
+		return 0.0
+	return values[min(int(fraction * len(values)), len(values) - 1)]
+
+def _response(status, payload, keep=True):
+	body	= json.dumps(payload, ensure_ascii=False).encode("utf-8")
+	head	= "HTTP/1.1 %d %s\r\nContent-Type: application/json; charset=utf-8\r\n"\
+		"Content-Length: %d\r\nConnection: %s\r\n\r\n" % (status,
+		REASONS[status], len(body), "keep-alive" if keep else "close")
+	return head.encode("latin-1") + body
+
+async def _headers(reader):
+	# {name: value} of HTTP headers from READER
+	result	= {}
+	while True:
+		line	= await reader.readline()
+		if line in (b"\r\n", b"\n", b""):
+			return result
+		name, colon, value	= line.decode("latin-1").partition(":")
+		if not colon:
+			raise ValueError("malformed header")
+		result[name.strip().lower()]	= value.strip()
+
+def _length(headers):
+	# length of the body by HEADERS
+	result	= int(headers.get("content-length", 0))
+	if result < 0:
+		raise ValueError("negative length")
+	return result
+
+#----STATS----
+
+class Stats:
+	"""
+	Counters of the service
+
+	instance.samples	(time, latency) of the last SAMPLES requests
+	"""
+	def __init__(self, samples=SAMPLES):
+		self.started	= time.monotonic()
+		self.samples	= deque(maxlen=samples)
+		self.requests	= 0
+		self.errors	= 0
+		self.texts	= 0
+		self.size	= 0
+		self.words	= 0
+		self.batches	= 0
+		self.batched	= 0
+		self.coalesced	= 0
+
+	def request(self, latency, texts, size, words):
+		"""
+		Return:		None
+
+		Counts request with TEXTS of SIZE bytes and WORDS corrected
+		in them, which was answered in LATENCY seconds
+		"""
+		self.samples.append((time.monotonic(), latency))
+		self.requests += 1
+		self.texts += texts
+		self.size += size
+		self.words += words
+
+	def batch(self, texts, unique):
+		"""
+		Return:		None
+
+		Counts batch of TEXTS, which had UNIQUE different texts
+		"""
+		self.batches += 1
+		self.batched += texts
+		self.coalesced += texts - unique
+
+	def report(self, corrector=None):
+		"""
+		Return:		dict
+
+		Returns counters, throughput (for the whole uptime and for
+		the last samples) and latency percentiles in milliseconds
+		"""
+		now	= time.monotonic()
+		uptime	= now - self.started
+		latency	= sorted(i[1] * 1000 for i in self.samples)
+		span	= now - self.samples[0][0] if self.samples else 0.0
+		result	= {
+			"uptime"	: round(uptime, 3),
+			"requests"	: self.requests,
+			"errors"	: self.errors,
+			"texts"		: self.texts,
+			"bytes"		: self.size,
+			"words"		: self.words,
+			"batches"	: self.batches,
+			"mean_batch"	: round(self.batched / self.batches, 2) if self.batches else 0.0,
+			"coalesced"	: self.coalesced,
+			"requests_per_second"	: round(self.requests / uptime, 1) if uptime else 0.0,
+			"recent_requests_per_second"	: round(len(latency) / span, 1) if span else 0.0,
+			"bytes_per_second"	: round(self.size / uptime) if uptime else 0,
+			"latency_ms"	: {
+				"p50"	: round(_percentile(latency, 0.50), 3),
+				"p90"	: round(_percentile(latency, 0.90), 3),
+				"p99"	: round(_percentile(latency, 0.99), 3),
+				"max"	: round(latency[-1], 3) if latency else 0.0,
+			},
+		}
+		if corrector is not None:
+			result["cache"]	= {"hits": corrector.hits, "misses": corrector.misses,
+						"paragraphs": len(corrector.cache)}
+		return result
+
+#----BATCHER----
+
+class Batcher:
+	"""
+	Queue of texts, which are corrected by batches
+
+	instance.queue		asyncio.Queue of (data, filetype, future)
+	"""
+	def __init__(self, corrector, stats, window=WINDOW, size=BATCH):
+		self.corrector	= corrector
+		self.stats	= stats
+		self.window	= window
+		self.size	= size
+		self.queue	= asyncio.Queue()
+
+	def submit(self, data, filetype=""):
+		"""
+		Return:		asyncio.Future
+
+		Puts DATA (bytes in utf-8) into the queue and returns
+		future of (corrected data, number of words)
+		"""
+		future	= asyncio.get_running_loop().create_future()
+		self.queue.put_nowait((data, filetype, future))
+		return future
+
+	async def run(self):
+		"""
+		Return:		None
+
+		Corrects batches of queued texts forever
+		"""
+		loop	= asyncio.get_running_loop()
+		while True:
+			batch	= [await self.queue.get()]
+			if self.window and self.queue.empty():
+				await asyncio.sleep(self.window)
+			while len(batch) < self.size and not self.queue.empty():
+				batch.append(self.queue.get_nowait())
+
+			# equal texts of the batch are corrected once
+			waiting	= {}
+			for data, filetype, future in batch:
+				waiting.setdefault((data, filetype), []).append(future)
+			texts	= list(waiting)
+			self.stats.batch(len(batch), len(texts))
+			try:
+				results	= await loop.run_in_executor(None,
+						self.corrector.correct_many, texts)
+			except Exception:
+				# one bad text must not fail the others of the batch
+				results	= await loop.run_in_executor(None, self.__each, texts)
+			for text, result in zip(texts, results):
+				for future in waiting[text]:
+					if future.done():
+						continue
+					if isinstance(result, Exception):
+						future.set_exception(result)
+					else:
+						future.set_result(result)
+
+	def __each(self, texts):
+		"""
+		Return:		list
+
+		Corrects TEXTS one by one: the result of a text is
+		(corrected data, number of words) or its exception
+		"""
+		result	= []
+		for text in texts:
+			try:
+				result.extend(self.corrector.correct_many([text]))
+			except Exception as error:
+				result.append(error)
+		return result
+
+#----SERVER----
+
+class Server:
+	"""
+	HTTP/JSON front of Batcher
+	"""
+	def __init__(self, corrector, window=WINDOW, size=BATCH):
+		self.corrector	= corrector
+		self.stats	= Stats()
+		self.batcher	= Batcher(corrector, self.stats, window, size)
+
+	async def correct(self, body):
+		"""
+		Return:		tuple
+
+		Returns (status, payload, counters) for BODY of POST /correct
+		COUNTERS are (texts, bytes, words) or None for errors
+		"""
+		try:
+			request	= json.loads(body)
+		except ValueError:
+			return 400, {"error": "body is not JSON"}, None
+		if not isinstance(request, dict):
+			return 400, {"error": "body must be JSON object"}, None
+		single	= "text" in request
+		texts	= [request["text"]] if single else request.get("texts")
+		filetype	= request.get("filetype", "")
+		if not isinstance(texts, list) or not all(isinstance(i, str) for i in texts):
+			return 400, {"error": "'text' must be string or 'texts' list of strings"}, None
+		if not isinstance(filetype, str):
+			return 400, {"error": "'filetype' must be string"}, None
+
+		try:
+			data	= [i.encode("utf-8") for i in texts]
+		except UnicodeEncodeError:
+			return 400, {"error": "text has lone surrogates"}, None
+		results	= await asyncio.gather(*[self.batcher.submit(i, filetype) for i in data])
+		corrected	= [i[0].decode("utf-8") for i in results]
+		words	= [i[1] for i in results]
+		counters	= (len(data), sum(len(i) for i in data), sum(words))
+		if single:
+			return 200, {"text": corrected[0], "words": words[0]}, counters
+		return 200, {"texts": corrected, "words": words}, counters
+
+	async def dispatch(self, method, path, body):
+		"""
+		Return:		tuple
+
+		Returns (status, payload, counters) for request (see
+		correct())
+		"""
+		path	= path.split("?", 1)[0]
+		if path == "/correct":
+			if method != "POST":
+				return 405, {"error": "use POST"}, None
+			return await self.correct(body)
+		if path == "/stats":
+			if method != "GET":
+				return 405, {"error": "use GET"}, None
+			return 200, self.stats.report(self.corrector), None
+		return 404, {"error": "unknown path %s" % path}, None
+
+	async def handle(self, reader, writer):
+		"""
+		Return:		None
+
+		Answers requests of one connection (with keep-alive)
+		"""
+		try:
+			while True:
+				line	= await reader.readline()
+				if not line.strip():
+					break
+				started	= time.monotonic()
+				try:
+					method, path, version	= line.decode("latin-1").split()
+					headers	= await _headers(reader)
+					length	= _length(headers)
+				except ValueError:
+					self.stats.errors += 1
+					writer.write(_response(400, {"error": "malformed request"}, False))
+					break
+				if length > MAX_BODY:
+					self.stats.errors += 1
+					writer.write(_response(413, {"error": "body is too large"}, False))
+					break
+				body	= await reader.readexactly(length)
+				keep	= headers.get("connection", "").lower() != "close"\
+					if version == "HTTP/1.1" else\
+					headers.get("connection", "").lower() == "keep-alive"
+
+				try:
+					status, payload, counters	= await self.dispatch(method,
+										path, body)
+				except Exception as error:
+					status, payload, counters	= 500, {"error": "%s: %s" % (
+						type(error).__name__, error)}, None
+				writer.write(_response(status, payload, keep))
+				if status != 200:
+					self.stats.errors += 1
+				elif counters is not None:
+					self.stats.request(time.monotonic() - started, *counters)
+				await writer.drain()
+				if not keep:
+					break
+		except (asyncio.IncompleteReadError, ConnectionError):
+			pass
+		finally:
+			writer.close()
+
+	async def serve(self, host=HOST, port=PORT, ready=None):
+		"""
+		Return:		None
+
+		Serves on HOST:PORT until SIGINT or SIGTERM
+		"""
+		loop	= asyncio.get_running_loop()
+		stop	= loop.create_future()
+		for number in (signal.SIGINT, signal.SIGTERM):
+			try:
+				loop.add_signal_handler(number, lambda: stop.done() or stop.set_result(None))
+			except (NotImplementedError, RuntimeError):
+				pass
+		batcher	= asyncio.ensure_future(self.batcher.run())
+		server	= await asyncio.start_server(self.handle, host, port)
+		print("Serving on http://%s:%d" % (host, port))
+		sys.stdout.flush()
+		if ready is not None:
+			ready()
+		try:
+			await stop
+		finally:
+			server.close()
+			await server.wait_closed()
+			batcher.cancel()
+
+#----LOAD TEST----
+
+async def _client(host, port, texts, deadline, latencies, failures):
+	reader, writer	= await asyncio.open_connection(host, port)
+	try:
+		while time.monotonic() < deadline:
+			body	= json.dumps({"text": random.choice(texts)},
+					ensure_ascii=False).encode("utf-8")
+			started	= time.monotonic()
+			writer.write(("POST /correct HTTP/1.1\r\nHost: %s\r\n"
+				"Content-Type: application/json\r\nContent-Length: %d\r\n\r\n"
+				% (host, len(body))).encode("latin-1") + body)
+			await writer.drain()
+			status	= int((await reader.readline()).split()[1])
+			headers	= await _headers(reader)
+			await reader.readexactly(_length(headers))
+			if status == 200:
+				latencies.append(time.monotonic() - started)
+			else:
+				failures.append(status)
+	finally:
+		writer.close()
+
+async def _stats(host, port):
+	reader, writer	= await asyncio.open_connection(host, port)
+	writer.write(b"GET /stats HTTP/1.1\r\nConnection: close\r\n\r\n")
+	await reader.readline()
+	headers	= await _headers(reader)
+	body	= await reader.readexactly(_length(headers))
+	writer.close()
+	return json.loads(body)
+
+async def load(host, port, texts, clients=32, seconds=10.0):
+	"""
+	Return:		dict
+
+	Posts random TEXTS from CLIENTS connections to the service for
+	SECONDS and returns throughput and latency, as clients see them
+	"""
+	latencies	= []
+	failures	= []
+	started		= time.monotonic()
+	await asyncio.gather(*[_client(host, port, texts, started + seconds,
+			latencies, failures) for i in range(clients)])
+	elapsed	= time.monotonic() - started
+	latencies.sort()
+	return {
+		"requests"	: len(latencies),
+		"errors"	: len(failures),
+		"requests_per_second"	: round(len(latencies) / elapsed, 1),
+		"latency_ms"	: dict((name, round(_percentile(latencies, fraction) * 1000, 3))
+				for name, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("max", 1.0))),
+		"server"	: await _stats(host, port),
+	}
+
+def _pieces(path, size):
+	# pieces of about SIZE characters of the text in PATH, cut by spaces
+	with open(path, "r", encoding="utf-8") as file:
+		text	= file.read(size * 100000)
+	result	= []
+	start	= 0
+	while start < len(text):
+		end	= text.find(" ", start + size)
+		end	= len(text) if end == -1 else end
+		result.append(text[start:end])
+		start	= end + 1
+	return result
+
+def main(argv=sys.argv):
+	parser	= argparse.ArgumentParser(prog=argv[0],
+			description="Corrects words without YO in texts posted over HTTP")
+	parser.add_argument("txt", nargs="?", help="yo.txt")
+	parser.add_argument("--host", default=HOST)
+	parser.add_argument("--port", type=int, default=PORT)
+	parser.add_argument("--window", type=float, default=WINDOW * 1000,
+			help="milliseconds to wait for more texts before a batch")
+	parser.add_argument("--batch", type=int, default=BATCH,
+			help="maximal number of texts in a batch")
+	parser.add_argument("--threshold", type=float, default=0.95,
+			help="confidence of context model for optional words")
+	parser.add_argument("--load", metavar="CORPUS",
+			help="load-test the running service with pieces of CORPUS")
+	parser.add_argument("--clients", type=int, default=32)
+	parser.add_argument("--seconds", type=float, default=10.0)
+	parser.add_argument("--size", type=int, default=300,
+			help="characters in a posted piece of CORPUS")
+	args	= parser.parse_args(argv[1:])
+
+	if args.load:
+		result	= asyncio.run(load(args.host, args.port, _pieces(args.load, args.size),
+				args.clients, args.seconds))
+		print(json.dumps(result, indent=2))
+		return 0 if result["requests"] else 1
+	if not args.txt:
+		parser.error("yo.txt or --load is required")
+
+	server	= Server(watch.corrector(args.txt, "utf-8", args.threshold),
+			args.window / 1000, args.batch)
+	asyncio.run(server.serve(args.host, args.port))
+	print(json.dumps(server.stats.report(server.corrector), indent=2))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
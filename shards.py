@@ -0,0 +1,149 @@
+"""
+Yo dictionary split into shards, which are loaded on demand
+
+Lines of yo.txt are spread over shards by hash of the word
+written with 'е' in lower case, so every form of a word (any case,
+with or without YO) is in the same shard. Spellchecker collects
+distinct words of the checked text and loads only the shards, which
+may contain them: a short text needs a few shards out of the whole
+dictionary
+
+Shards are built once from yo.txt into one file, one after another,
+and rebuilt, when yo.txt is changed. Index file keeps the stamp of
+yo.txt and offsets of shards, so a shard is read by one seek
+
+This module does not need vim
+"""
+import os, zlib
+
+#----GLOBAL VARS----
+
+SHARDS		= 1024
+INDEX		= "index"
+WORDS		= "words.txt"
+
+#----AUXILLIARY FUNCS----
+
+def shard(word, count=SHARDS):
+	"""
+	Return:		int
+
+	Returns number of the shard for WORD
+	"""
+	key	= word.lower().replace("ё", "е")
+	return zlib.crc32(key.encode("utf-8", "surrogatepass")) % count
+
+def _word(line):
+	return line[2:].strip() if line.startswith("*") else line.strip()
+
+#----SHARDEDDICTIONARY----
+
+class ShardedDictionary:
+	"""
+	Shards of yo.txt in PATH directory
+
+	instance.path		directory of shards
+	instance.count		number of shards
+	instance.offsets	byte offsets of shards (and of the end)
+	instance.loaded		numbers of shards, which were read
+	"""
+	def __init__(self, path, count=SHARDS):
+		self.path	= path
+		self.count	= count
+		self.offsets	= None
+		self.loaded	= set()
+
+	def fresh(self, stamp):
+		"""
+		Return:		bool
+
+		Returns True, if shards were built from yo.txt with STAMP
+		((mtime, size) pair)
+		"""
+		try:
+			with open(os.path.join(self.path, INDEX), "r") as file:
+				mtime, size, count	= file.readline().split()
+				offsets	= [int(i) for i in file.readline().split()]
+		except (OSError, ValueError):
+			return False
+		if (float(mtime), int(size)) != tuple(stamp) or int(count) != self.count:
+			return False
+		self.offsets	= offsets
+		return len(offsets) == self.count + 1
+
+	def build(self, txt, stamp):
+		"""
+		Return:		int
+
+		Splits TXT file with STAMP ((mtime, size) pair) into shards
+		and returns number of lines. Files are written aside and
+		replaced at once
+		"""
+		parts	= [[] for i in range(self.count)]
+		counter	= 0
+		with open(txt, "r", encoding="utf-8") as file:
+			for line in file:
+				word	= _word(line)
+				if word:
+					parts[shard(word, self.count)].append(line.strip() + "\n")
+					counter += 1
+
+		os.makedirs(self.path, exist_ok=True)
+		offsets	= [0]
+		path	= os.path.join(self.path, WORDS)
+		with open(path + ".tmp", "wb") as file:
+			for lines in parts:
+				file.write("".join(lines).encode("utf-8"))
+				offsets.append(file.tell())
+		os.replace(path + ".tmp", path)
+
+		path	= os.path.join(self.path, INDEX)
+		with open(path + ".tmp", "w") as file:
+			file.write("%r %d %d\n" % (stamp[0], stamp[1], self.count))
+			file.write(" ".join(map(str, offsets)) + "\n")
+		os.replace(path + ".tmp", path)
+		self.offsets	= offsets
+		return counter
+
+	def needed(self, words):
+		"""
+		Return:		set
+
+		Returns numbers of shards for WORDS, which are not loaded yet
+		"""
+		return set(shard(i, self.count) for i in words) - self.loaded
+
+	def lines(self, numbers):
+		"""
+		Return:		generator
+
+		Yields lines (in yo.txt format) of shards with NUMBERS
+		"""
+		if not numbers:
+			return
+		with open(os.path.join(self.path, WORDS), "rb") as file:
+			for number in sorted(numbers):
+				file.seek(self.offsets[number])
+				data	= file.read(self.offsets[number + 1] - self.offsets[number])
+				for line in data.decode("utf-8").splitlines():
+					yield line
+
+	def load(self, numbers):
+		"""
+		Return:		list
+
+		Reads shards with NUMBERS, which are not loaded yet, marks
+		them as loaded and returns their lines
+		"""
+		numbers	= set(numbers) - self.loaded
+		result	= list(self.lines(numbers))
+		self.loaded.update(numbers)
+		return result
+
+	def complete(self):
+		"""
+		Return:		bool
+
+		Returns True, if every shard is loaded
+		"""
+		return len(self.loaded) == self.count
@@ -8,7 +8,57 @@ try:
 except ImportError:
 	raise ImportError("This module is only available with buffer module!")
 
-import os, shelve
+import os, re, shelve, threading, glob, bisect, zlib, hashlib, time
+import context, engine, spellfile, regions, shards, vector, tiered, strategy
+
+#----AUXILLIARY FUNCS----
+
+def _user_dir(variable, default, name):
+	"""
+	Return:		str
+
+	Returns directory NAME of the plugin in per-user directory from
+	environment VARIABLE (XDG_CACHE_HOME, ...) or DEFAULT, quoted
+	for vim's single quoted string
+	"""
+	base	= os.environ.get(variable) or os.path.expanduser(default)
+	return os.path.join(base, "vim-yo", name).replace("'", "''")
+
+def _changes(matches, encoding):
+	"""
+	Return:		list | None
+
+	Returns (line, column, 'е', 'ё') changes of letters (see
+	buffer.Buffer.substitute()) for MATCHES in ENCODING codec or
+	None, if some of them changes more than letters
+	"""
+	pairs	= [(i.encode(encoding), j.encode(encoding)) for i, j in (("е", "ё"), ("Е", "Ё"))]
+	result	= []
+	for match in matches:
+		if len(match) < 5 or match[1] - match[0] != len(match[2]):
+			return None
+		start, end, replacement, line, column	= match[:5]
+		for ye, yo in pairs:
+			pos	= replacement.find(yo)
+			while pos != -1:
+				result.append((line, column + pos, ye, yo))
+				pos	= replacement.find(yo, pos + len(yo))
+	return result
+
+def _parse_line(line):
+	"""
+	Return:		tuple | None
+
+	Returns (table, key, word) for the line of .txt file
+	"""
+	if line.startswith("*"):
+		word	= line[2:].strip()
+		table	= "optional"
+	else:
+		word	= line.strip()
+		table	= "necessary"
+	if word:
+		return table, word.replace("ё", "е"), word
 
 class YoSpellchecker:
 	def __init__(self, path, buffer):
@@ -16,51 +66,541 @@ class YoSpellchecker:
 
 		self.yo_path	= path
 		self.yo_txt	= path + ".txt"
+		self.yo_ctx	= path + ".ctx"
+		self.yo_freq	= self.yo_txt + ".freq"
 
 		self.optional	= {}
 		self.necessary	= {}
+		self.engines	= {}
+
+		# words are loaded by shards, which are needed for the
+		# checked text (see shards.py), if directory is given
+		self.shard_dir	= None
+		self.shards	= None
+
+		# words are looked up in cold files of the directory through
+		# small hot tiers (see tiered.py), if directory is given;
+		# limits are shared by both tables
+		self.tiered_dir		= None
+		self.hot_entries	= tiered.HOT_ENTRIES
+		self.hot_bytes		= tiered.HOT_BYTES
+
+		# (mtime, size) of loaded .txt and prepared changes of it
+		self.txt_stat	= None
+		self.pending	= None
+		self.watcher	= None
+
+		# checked lines (zero-leader, last is not included)
+		self.first	= 0
+		self.last	= None
+
+		# texts longer than self.parallel bytes are scanned by
+		# self.workers processes (all cores by default), 0 - never
+		self.parallel	= strategy.DEFAULTS["parallel"]
+		self.workers	= None
+
+		# texts longer than self.vector bytes are scanned at once by
+		# vectorized scanner, if NumPy is installed (0 - never)
+		self.vector	= strategy.DEFAULTS["vector"]
+
+		# texts checked before and longer than self.incremental bytes
+		# are scanned by chunks, which are cached - even if they are
+		# longer than self.parallel or self.vector (0 - never)
+		self.incremental	= strategy.DEFAULTS["incremental"]
+		self.chunks		= strategy.Incremental()
+
+		# forced strategy (see strategy.STRATEGIES), chosen by size
+		# and history of (buffer number, name, table), if it is empty
+		self.scanning		= ""
+		self.chosen		= None
+		self.history		= set()
+
+		# more than self.native corrections at once are applied by
+		# vim's :substitute (0 - never, see apply())
+		self.native	= 1000
+
+		# words in code, URLs, markup and comments are not checked
+		self.protect	= True
+
+		self.context		= None
+		self.context_threshold	= 0.95
+
+		# {(buffer number, match): (key, previous word, next word)}
+		# of the last scan, shared by context model and memory
+		self.contexts		= {}
+
+		# decisions about optional words: shelve of the project of
+		# current buffer, out of {root: shelve} of opened projects
+		self.memory		= None
+		self.memories		= {}
+		self.memory_dir		= None
 
-		side		= r"[^\s\.\,\"\'\-\:\\\/\<\>\;\(\)\!\?\_\[\]]*"
-		center		= r"[е|Е]"
+		# review optional words in popup menu instead of dialogs
+		self.popup		= False
 
-		self.pattern	= self.buffer.re.compile(side + center + side)
+		# popup review scans optional words by vim timers in slices
+		# of self.slice milliseconds, self.slice_lines lines at once,
+		# starting from the cursor (0 - scan everything at once)
+		self.slice		= 0
+		self.slice_lines	= 1000
 
 	#----auxilliary methods----
 
-	def __fix_case(self, left, right):
+	def engine(self, vectorized=False):
 		"""
-		Return:		str | None
+		Return:		engine.ByteEngine
 
-		Checks left argument case, and returns right argument
-		int the same case
-		If case wasn't recognized, returns None
+		Returns scanner (vector.VectorEngine, if VECTORIZED) for
+		current buffer encoding
+		Scanners are cached until dictionary is reread
 		"""
-		if left.islower():
-			return right.lower()
-		elif left.isupper():
-			return right.upper()
-		elif left.istitle():
-			return right.title()
+		encoding	= self.buffer.encoding
+		key		= (encoding, "vector") if vectorized else encoding
+		if key not in self.engines:
+			tables	= {"optional": self.optional, "necessary": self.necessary}
+			if vectorized:
+				self.engines[key]	= vector.VectorEngine(encoding, **tables)
+			else:
+				self.engines[key]	= engine.ByteEngine(encoding, **tables)
+		return self.engines[key]
+
+	def candidates(self, table):
+		"""
+		Return:		list
+
+		Returns (start, end, replacement, line, column) tuples for
+		the words of buffer, which are found in TABLE dictionary
+		('optional' or 'necessary'). Buffer is read line by line,
+		only lines from self.first to self.last are checked
+		The way of scanning is chosen by choose()
+		Words in protected regions are skipped (see self.protect)
+		"""
+		scanner	= self.engine()
+		newline	= self.buffer.newlines.encode(self.buffer.encoding)
+		last	= len(self.buffer.buffer)
+		if self.last is not None:
+			last	= min(self.last, last)
+		base	= self.buffer.line_offset(self.first)
+		skip	= None
+
+		if self.shards is not None and not self.shards.complete():
+			words	= set()
+			for number, line in self.buffer.lines(self.first, last, encoded=True):
+				words.update(scanner.vocabulary(line))
+			self.load_shards(self.shards.needed(words))
+
+		size	= self.buffer.line_offset(last) - base
+		choice	= self.choose(size, table)
+		protect	= self.protect and scanner.mode != "decode"
+		if choice == "incremental":
+			# regions of chunks are cached with their candidates
+			lines	= self.buffer.lines(self.first, last, encoded=True)
+			return list(self.chunks.scan_lines(scanner, lines, table, len(newline),
+					base, filetype=self.__filetype() if protect else None))
+
+		if protect:
+			lines	= self.buffer.lines(self.first, last, encoded=True)
+			index	= regions.index(self.__filetype(), lines, len(newline), base)
+			if index:
+				skip	= index.protects
+
+		if choice == "parallel":
+			return self.__joined_candidates(lambda data: engine.parallel_scan(
+				scanner, data, table, self.workers, newline, skip, base),
+				newline, last, base)
+		if choice == "vector":
+			scanner	= self.engine(True)
+			return self.__joined_candidates(lambda data: scanner.scan(
+				data, table, skip=skip, shift=base), newline, last, base)
+
+		lines	= self.buffer.lines(self.first, last, encoded=True)
+		return list(scanner.scan_lines(lines, table, len(newline), base, skip))
+
+	def choose(self, size, table):
+		"""
+		Return:		str
+
+		Returns strategy of scanning SIZE bytes of buffer for TABLE
+		(see strategy.choose()) and remembers, that the buffer was
+		checked with TABLE
+		"""
+		key	= (self.buffer.buffer.number, self.buffer.buffer.name, table)
+		thresholds	= {"vector": self.vector, "parallel": self.parallel,
+				"incremental": self.incremental}
+		vectorized	= vector.available() and not self.tiered_dir
+		self.chosen	= strategy.choose(size, thresholds, key in self.history,
+					vectorized, self.scanning)
+		self.history.add(key)
+		return self.chosen
+
+	def scan(self, tables=None):
+		"""
+		Return:		engine.Candidates
+
+		Returns candidates of buffer (from self.first to self.last
+		lines) for every dictionary of TABLES (all of them by default)
+		as compact arrays, without any dialogs and changes of buffer
+		"""
+		result	= engine.Candidates()
+		for table in tables or engine.KINDS:
+			result.extend(self.candidates(table), table)
+		return result
+
+	def __filetype(self):
+		try:
+			result	= self.buffer.buffer.options["filetype"]
+		except (AttributeError, KeyError):
+			result	= vim.eval("&filetype")
+		if isinstance(result, bytes):
+			result	= result.decode()
+		return result
+
+	def __joined_candidates(self, scan, newline, last, base):
+		# SCAN takes the checked lines joined into one bytes object
+		lines	= [i for number, i in self.buffer.lines(self.first, last, encoded=True)]
+		offsets	= []
+		offset	= 0
+		for i in lines:
+			offsets.append(offset)
+			offset += len(i) + len(newline)
+		data	= newline.join(lines)
+		del lines
+
+		result	= []
+		for start, end, replacement in scan(data):
+			number	= bisect.bisect_right(offsets, start) - 1
+			result.append((base + start, base + end, replacement,
+					self.first + number, start - offsets[number]))
+		return result
 
 	def read_txt(self):
 		"""
 		Return:		None
 
 		Reads words from .txt
+		With self.tiered_dir words are looked up in cold files (they
+		are built, if .txt is newer), with self.shard_dir only shards
+		of .txt are prepared and words are read later by load_shards()
 		"""
-		optional	= {}
-		necessary	= {}
+		tables	= {"optional": {}, "necessary": {}}
 
-		print("Reading words from .txt file...")
+		stat	= self.__txt_stat()
+		for i in (self.optional, self.necessary):
+			if isinstance(i, tiered.TieredTable):
+				i.cold.close()
+		self.shards	= None
+		if self.tiered_dir:
+			self.__build_cold(stat)
+			for name in tables:
+				cold	= tiered.ColdTable(os.path.join(self.tiered_dir, name))
+				tables[name]	= tiered.TieredTable(cold, "utf-8",
+						self.hot_entries // 2, self.hot_bytes // 2)
+				if os.path.exists(self.yo_freq):
+					with open(self.yo_freq, "r", encoding="utf-8") as file:
+						tables[name].prewarm(file)
+		elif self.shard_dir:
+			self.shards	= shards.ShardedDictionary(self.shard_dir)
+			if not self.shards.fresh(stat):
+				print("Splitting .txt file into shards...")
+				self.shards.build(self.yo_txt, stat)
+		else:
+			print("Reading words from .txt file...")
+			with open(self.yo_txt, "r") as file:
+				for i in file.readlines():
+					entry	= _parse_line(i)
+					if entry:
+						tables[entry[0]][entry[1]] = entry[2]
+		self.optional	= tables["optional"]
+		self.necessary	= tables["necessary"]
+		self.engines	= {}
+		self.chunks.clear()
+		self.txt_stat	= stat
+		self.pending	= None
 
-		with open(self.yo_txt, "r") as file:
-			for i in file.readlines():
-				if i.startswith("*"):
-					optional[i[2:].replace("ё", "е").strip()] = i[2:].strip()
-				else:
-					necessary[i.replace("ё", "е").strip()] = i.strip()
-		self.optional	= optional
-		self.necessary	= necessary
+	def __build_cold(self, stat):
+		paths	= [os.path.join(self.tiered_dir, i) for i in ("optional", "necessary")]
+		if all(tiered.fresh(i, stat) for i in paths):
+			return
+		print("Writing words of .txt file into cold files...")
+		os.makedirs(self.tiered_dir, exist_ok=True)
+		for path, table in zip(paths, spellfile.read_txt(self.yo_txt)):
+			tiered.build(path, table, stat)
+
+	def load_shards(self, numbers=None):
+		"""
+		Return:		int
+
+		Reads words of shards with NUMBERS (all by default), which
+		are not loaded yet, and returns number of read words
+		"""
+		if self.shards is None:
+			return 0
+		if numbers is None:
+			numbers	= range(self.shards.count)
+		# shards are not read, while they are rebuilt by diff_txt()
+		if self.watcher and self.watcher.is_alive():
+			self.watcher.join()
+		counter	= 0
+		for i in self.shards.load(numbers):
+			entry	= _parse_line(i)
+			if entry:
+				self.__add_word(*entry)
+				counter += 1
+		return counter
+
+	def __add_word(self, table, key, word):
+		getattr(self, table)[key]	= word
+		for scanner in self.engines.values():
+			scanner.add(table, key, word)
+
+	def __txt_stat(self):
+		stat	= os.stat(self.yo_txt)
+		return stat.st_mtime, stat.st_size
+
+	def __txt_lines(self):
+		lines	= set("* " + i for i in self.optional.values())
+		lines.update(self.necessary.values())
+		return lines
+
+	def diff_txt(self):
+		"""
+		Return:		None
+
+		Compares .txt file with loaded words and stores
+		(stat, removed lines, added lines) in self.pending
+		Changed words are both removed and added
+		"""
+		stat	= self.__txt_stat()
+		if self.tiered_dir:
+			# cold files are rebuilt aside, update_txt() maps them
+			self.__build_cold(stat)
+			self.pending	= (stat, None, None)
+			return
+		if self.shards is not None:
+			# only loaded shards are compared
+			if not self.shards.fresh(stat):
+				self.shards.build(self.yo_txt, stat)
+			lines	= set(i.strip() for i in self.shards.lines(self.shards.loaded))
+		else:
+			with open(self.yo_txt, "r") as file:
+				lines	= set(i.strip() for i in file)
+		lines.discard("")
+		loaded		= self.__txt_lines()
+		self.pending	= (stat, loaded - lines, lines - loaded)
+
+	def watch_txt(self):
+		"""
+		Return:		None
+
+		Starts diff_txt() in the background, if .txt file
+		was changed since it was loaded
+		"""
+		if self.watcher and self.watcher.is_alive():
+			return
+		if self.__txt_stat() == self.txt_stat:
+			return
+		if self.pending and self.pending[0] == self.__txt_stat():
+			return
+		self.watcher	= threading.Thread(target=self.diff_txt, daemon=True)
+		self.watcher.start()
+
+	def update_txt(self):
+		"""
+		Return:		int
+
+		Applies changes of .txt file to loaded words and scanners
+		and returns number of changed lines. Unchanged file costs
+		one os.stat() call
+		"""
+		if self.watcher and self.watcher.is_alive():
+			self.watcher.join()
+		if self.__txt_stat() == self.txt_stat:
+			return 0
+		if not self.pending or self.pending[0] != self.__txt_stat():
+			self.diff_txt()
+
+		stat, removed, added	= self.pending
+		if self.tiered_dir:
+			self.read_txt()
+			print("Cold files were rebuilt from changed .txt file")
+			return 1
+		tables	= {"optional": self.optional, "necessary": self.necessary}
+		for i in removed:
+			table, key, word	= _parse_line(i)
+			if tables[table].get(key) == word:
+				del tables[table][key]
+				for scanner in self.engines.values():
+					scanner.remove(table, key)
+		for i in added:
+			self.__add_word(*_parse_line(i))
+
+		self.txt_stat	= stat
+		self.pending	= None
+		if removed or added:
+			self.chunks.clear()
+			print("%d words were removed and %d added from .txt file"\
+					% (len(removed), len(added)))
+		return len(removed) + len(added)
+
+	def read_ctx(self):
+		"""
+		Return:		None
+
+		Reads context model from .ctx, if it exists
+		"""
+		if os.path.exists(self.yo_ctx):
+			self.context	= context.ContextModel.load(self.yo_ctx)
+
+	def __contexts(self, matches):
+		# (word with 'е' in lower case, previous word, next word) for
+		# every match of MATCHES; lines of the ones, which are not
+		# in self.contexts, are taken from vim at once
+		number	= self.buffer.buffer.number
+		missing	= [i for i in matches if (number, i[:5]) not in self.contexts]
+		if missing:
+			scanner	= self.engine()
+			lines	= self.buffer.encoded_lines_at(i[3] for i in missing)
+			for match in missing:
+				start, end, replacement, line, column	= match[:5]
+				prev, next	= scanner.neighbours(lines[line], column,
+							column + end - start)
+				key	= scanner.lower(replacement).decode(
+						scanner.encoding).replace("ё", "е")
+				self.contexts[(number, match[:5])]	= (key, prev, next)
+		return [self.contexts[(number, i[:5])] for i in matches]
+
+	#----decision memory----
+
+	def open_memory(self):
+		"""
+		Return:		None
+
+		Opens shelve with decisions about optional words for the
+		project of current buffer: the nearest parent directory with
+		.git, .hg, .svn or .bzr, or the directory of the file
+		Shelves of other projects are kept open until close_memory(),
+		so buffers of several projects can be switched
+		"""
+		if not self.memory_dir:
+			return
+		root	= os.path.dirname(os.path.abspath(self.buffer.buffer.name or "."))
+		folder	= root
+		while os.path.dirname(folder) != folder:
+			if any(os.path.exists(os.path.join(folder, i))
+					for i in (".git", ".hg", ".svn", ".bzr")):
+				root	= folder
+				break
+			folder	= os.path.dirname(folder)
+
+		if root not in self.memories:
+			os.makedirs(self.memory_dir, exist_ok=True)
+			name	= hashlib.md5(root.encode("utf-8", "surrogateescape")).hexdigest()
+			self.memories[root]	= shelve.open(os.path.join(self.memory_dir, name[:16]))
+		self.memory	= self.memories[root]
+
+	def close_memory(self):
+		"""
+		Return:		None
+
+		Writes decisions to disk
+		"""
+		for i in self.memories.values():
+			i.close()
+		self.memories	= {}
+		self.memory	= None
+
+	def __memory_keys(self, matches):
+		result	= []
+		for key, prev, next in self.__contexts(matches):
+			digest	= zlib.crc32(("%s\x00%s" % (prev, next)).encode("utf-8")) & 0xffff
+			result.append("%s:%04x" % (key, digest))
+		return result
+
+	def remember(self, matches, yo):
+		"""
+		Return:		None
+
+		Remembers that MATCHES are written with YO (or not)
+		"""
+		if self.memory is not None:
+			for i in self.__memory_keys(matches):
+				self.memory[i] = yo
+
+	def memory_correction(self, matches):
+		"""
+		Return:		list
+
+		Corrects MATCHES, which user once decided to write with YO
+		in the same context, drops the ones, which user decided to
+		keep, and returns the rest
+		"""
+		if self.memory is None:
+			return matches
+		yo	= []
+		rest	= []
+		kept	= 0
+		for i, key in zip(matches, self.__memory_keys(matches)):
+			decision	= self.memory.get(key)
+			if decision is None:
+				rest.append(i)
+			elif decision:
+				yo.append(i)
+			else:
+				kept += 1
+		self.apply(yo)
+		if yo or kept:
+			print("%d words were corrected and %d were kept as you decided before"\
+					% (len(yo), kept))
+		return rest
+
+	def apply(self, matches, buf=None):
+		"""
+		Return:		None
+
+		Corrects MATCHES in BUF (self.buffer by default): many of
+		them are replaced by vim's :substitute, which does not copy
+		lines through python (see buffer.Buffer.substitute()), the
+		rest and the ones, which vim cannot substitute, by
+		buffer.Buffer.patch()
+		"""
+		buf	= buf or self.buffer
+		if self.native and len(matches) > self.native:
+			changes	= _changes(matches, buf.encoding)
+			if changes is not None and buf.substitute(changes):
+				return
+		buf.patch(matches)
+
+	def valid(self, match):
+		"""
+		Return:		bool
+
+		Checks, that the word of MATCH was not changed by user
+		since it was found
+		"""
+		start, end, replacement, line, column	= match[:5]
+		scanner	= self.engine()
+		current	= self.buffer.encoded_line(line)[column:column + end - start]
+		return scanner.lower(current) ==\
+			scanner.lower(replacement).replace(scanner.yo, scanner.ye)
+
+	def context_correction(self, matches):
+		"""
+		Return:		list
+
+		Scores optional MATCHES by context model, corrects the ones,
+		which surely must be written with YO, drops the ones, which
+		surely must not, and returns the rest sorted from the most
+		doubtful one
+		"""
+		items	= self.__contexts(matches)
+
+		yo, ye, rest	= self.context.classify(items, self.context_threshold)
+
+		self.apply([matches[i] for i in yo])
+		if yo or ye:
+			print("%d words were corrected and %d were kept by context model"\
+					% (len(yo), len(ye)))
+		return [matches[i] for i in rest]
 
 	def necessary_correction(self):
 		"""
@@ -69,9 +609,7 @@ class YoSpellchecker:
 		Finds in buffer words, written with 'E' | 'e' letter
 		and replaces them in buffer, if it is necessary
 		"""
-		pattern	= self.buffer.re.compile(self.pattern)
-		matches	= [i for i in self.buffer.re.finditer(pattern) \
-				if i.group().decode(self.buffer.encoding).lower() in self.necessary]
+		matches	= self.candidates("necessary")
 		counter = len(matches)
 
 
@@ -86,11 +624,7 @@ class YoSpellchecker:
 		action	= self.buffer.interactive(None, None, msg, choices, 1)
 	
 		if action == 1:
-			for i in range(counter):
-				word		= matches[i].group().decode()
-				replacement	= self.necessary[word.lower()]
-				replacement	= self.__fix_case(word, replacement)
-				self.buffer[matches[i].start():matches[i].end()] = replacement.encode()
+			self.apply(matches)
 		self.buffer.vim2py()
 
 	def optional_correction(self):
@@ -101,9 +635,16 @@ class YoSpellchecker:
 		Highlights them and gives user an option to correct
 		them one by one, or to correct them all at once
 		"""
-		pattern = self.buffer.re.compile(self.pattern)
-		matches	= [i for i in self.buffer.re.finditer(pattern) \
-				if i.group().decode(self.buffer.encoding).lower() in self.optional]
+		if self.popup and self.slice:
+			global _review
+			_review	= PopupReview(self, [], SlicedScan(self, "optional"))
+			_review.start()
+			return
+
+		matches	= self.memory_correction(self.candidates("optional"))
+		ordered	= self.context is not None
+		if ordered:
+			matches	= self.context_correction(matches)
 		counter	= len(matches)
 
 		if not counter:
@@ -111,10 +652,15 @@ class YoSpellchecker:
 			action	= self.buffer.interactive(None, None, msg, "&Ok", 0)
 			return
 
+		if self.popup:
+			_review	= PopupReview(self, matches)
+			_review.show()
+			return
+
 		msg	= "%d word out of %d left."\
 				" You can choose which words to correct,"\
 				" or to correct them all at once!"
-		choices	= "&Correct\n&All\n&Backwards\n&Forward\n&Exit"
+		choices	= "&Correct\n&Keep\n&All\n&Backwards\n&Forward\n&Exit"
 
 		entry		= self.buffer.tell()
 		closest		= matches[0]
@@ -123,25 +669,23 @@ class YoSpellchecker:
 
 		warning		= "You have went through all the file %s!"
 
-		for i in range(counter):
-			if abs(entry - matches[i].start()) < entry - closest.start():
+		for i in range(0 if ordered else counter):
+			if abs(entry - matches[i][0]) < entry - closest[0]:
 				closest		= matches[i]
 				closest_pointer	= i
 				pointer 	= i
 
 		direction	= 0
-		start		= matches[pointer].start()
-		end		= matches[pointer].end()
+		start		= matches[pointer][0]
+		end		= matches[pointer][1]
 
 		action	= self.buffer.interactive(start, end, msg % (pointer + 1, counter), choices, 0)
-		while action != 5:
-			if action == 1:
-				# correct one highlighted word
-				word		= matches[pointer].group().decode(self.buffer.encoding)
-				replacement	= self.optional[word.lower()]
-				replacement	= self.__fix_case(word, replacement)
-
-				self.buffer[start:end] = replacement
+		while action != 6:
+			if action in (1, 2):
+				# correct one highlighted word or keep it as is
+				if action == 1:
+					self.buffer.patch([matches[pointer]])
+				self.remember([matches[pointer]], action == 1)
 
 				del matches[pointer]
 
@@ -155,26 +699,19 @@ class YoSpellchecker:
 				if matches == []:
 					break
 
-				start		= matches[pointer].start()
-				end		= matches[pointer].end()
-			elif action == 2:
+				start		= matches[pointer][0]
+				end		= matches[pointer][1]
+			elif action == 3:
 				# correct all the words
 
-				for i in range(len(matches)):
-					start	= matches[i].start()
-					end	= matches[i].end()
-					word	= matches[i].group().decode(self.buffer.encoding)
-
-					replacement	= self.optional[word.lower()]
-					replacement	= self.__fix_case(word, replacement)
-
-					self.buffer[start:end] = replacement
+				self.apply(matches)
+				self.remember(matches, True)
 				counter = 0
-			elif action == 3:
+			elif action == 4:
 				# go to previous word
 				if direction == -1 and pointer == closest_pointer and counter != 1:
-					self.buffer.interactive(matches[pointer].start(),\
-								matches[pointer].end(),\
+					self.buffer.interactive(matches[pointer][0],\
+								matches[pointer][1],\
 						 		warning % "backwards",\
 								"&Ok", 1)
 				else:
@@ -183,15 +720,15 @@ class YoSpellchecker:
 					if pointer < 0:
 						pointer = len(matches) - 1
 
-					start	= matches[pointer].start()
-					end	= matches[pointer].end()
+					start	= matches[pointer][0]
+					end	= matches[pointer][1]
 				if pointer == closest_pointer and direction > -1:
 					direction -= 1
-			elif action == 4:
+			elif action == 5:
 				# go to next word
 				if direction == 1 and pointer % counter == closest_pointer and counter != 1:
-					self.buffer.interactive(matches[pointer].start(),\
-								matches[pointer].end(),\
+					self.buffer.interactive(matches[pointer][0],\
+								matches[pointer][1],\
 								warning % "forward",\
 								"&Ok", 1)
 				else:
@@ -200,11 +737,11 @@ class YoSpellchecker:
 					if pointer > len(matches) - 1:
 						pointer = 0
 
-					start	= matches[pointer].start() 
-					end	= matches[pointer].end()
+					start	= matches[pointer][0] 
+					end	= matches[pointer][1]
 				if pointer == closest_pointer and direction < 1:
 					direction += 1
-			elif action == 5:
+			elif action == 6:
 				# cancel
 				break
 			if counter == 0:
@@ -212,15 +749,898 @@ class YoSpellchecker:
 			action	= self.buffer.interactive(start, end, msg % (pointer + 1,counter), choices, 0)
 		self.buffer.vim2py()
 		self.buffer.seek(entry)
+		self.buffer.sync()
+
+	def group_correction(self):
+		"""
+		Return:		None
+
+		Finds words, which optionally may be written with YO, groups
+		them by word and asks about every group once, starting from
+		the most frequent word. The whole group is corrected at once,
+		except the occurrences, which user chose one by one
+		"""
+		matches	= self.memory_correction(self.candidates("optional"))
+		if not matches:
+			msg	= "No words, written without optional YO were found!"
+			self.buffer.interactive(None, None, msg, "&Ok", 0)
+			return
+
+		scanner	= self.engine()
+		groups	= {}
+		for i in matches:
+			groups.setdefault(scanner.lower(i[2]), []).append(i)
+		groups	= sorted(groups.items(), key=lambda i: (-len(i[1]), i[0]))
+
+		msg	= "%s: %d times (word %d of %d)."\
+				" Do you want to correct all of them?"
+		choices	= "&Correct all\n&Keep all\n&One by one\n&Skip\n&Exit"
+		counter	= [0, 0]
+		for number, (word, group) in enumerate(groups):
+			word	= word.decode(scanner.encoding)
+			action	= self.buffer.interactive(group[0][0], group[0][1],
+					msg % (word, len(group), number + 1, len(groups)),
+					choices, 1)
+			if action == 1:
+				correct, keep	= group, []
+			elif action == 2:
+				correct, keep	= [], group
+			elif action == 3:
+				correct, keep	= self.__group_exceptions(word, group)
+			elif action == 4:
+				continue
+			else:
+				break
+			correct	= [i for i in correct if self.valid(i)]
+			self.apply(correct)
+			self.remember(correct, True)
+			self.remember(keep, False)
+			counter[0] += len(correct)
+			counter[1] += len(keep)
+
+		self.buffer.vim2py()
+		print("%d words were corrected and %d were kept" % tuple(counter))
+
+	def __group_exceptions(self, word, group):
+		# asks about occurrences of the word one by one, until user
+		# decides about the rest of them
+		msg	= "%s (%d of %d)"
+		choices	= "&Correct\n&Keep\nCorrect &rest\nKeep r&est"
+		correct	= []
+		keep	= []
+		for i, match in enumerate(group):
+			action	= self.buffer.interactive(match[0], match[1],
+					msg % (word, i + 1, len(group)), choices, 1)
+			if action == 1:
+				correct.append(match)
+			elif action == 3:
+				correct.extend(group[i:])
+				break
+			elif action == 4:
+				keep.extend(group[i:])
+				break
+			else:
+				keep.append(match)
+		return correct, keep
+
+	def scratch_correction(self):
+		"""
+		Return:		None
+
+		Finds words, which optionally may be written with YO, and
+		lists them in a scratch buffer for review (see ScratchReview)
+		"""
+		matches	= self.memory_correction(self.candidates("optional"))
+		if not matches:
+			msg	= "No words, written without optional YO were found!"
+			self.buffer.interactive(None, None, msg, "&Ok", 0)
+			return
+
+		marks	= []
+		items	= self.__contexts(matches) if self.context is not None else []
+		for i in range(len(matches)):
+			p	= None
+			if self.context is not None:
+				p	= self.context.score(*items[i])
+			marks.append(p is None or p >= 0.5)
+		ScratchReview(self, matches, marks).open()
+
+	def batch_correction(self, buffers):
+		"""
+		Return:		None
+
+		Corrects words in every Buffer of BUFFERS with the same
+		dictionary: words without necessary YO are corrected in all
+		buffers after one confirmation, optional words are reviewed
+		in one session, which goes through all buffers
+		"""
+		current		= self.buffer
+		necessary	= []
+		optional	= []
+
+		for i in buffers:
+			self.__switch(i)
+			self.first	= 0
+			self.last	= None
+			necessary.append((i, self.candidates("necessary")))
+			matches	= self.memory_correction(self.candidates("optional"))
+			if self.context is not None:
+				matches	= self.context_correction(matches)
+			optional.extend((i, j) for j in matches)
+
+		counter	= sum(len(j) for i, j in necessary)
+		if counter:
+			msg	= "%d words, written without necessary YO were found in %d buffers!"\
+					" Do you want to correct them?" % (counter,
+					len([j for i, j in necessary if j]))
+			if current.interactive(None, None, msg, "&Yes\n&No", 1) == 1:
+				for i, matches in necessary:
+					if matches:
+						self.apply(matches, i)
+
+		msg	= "%d word out of %d left (%s)."\
+				" You can choose which words to correct,"\
+				" or to correct them all at once!"
+		choices	= "&Correct\n&Keep\n&All\n&Backwards\n&Forward\n&Exit"
+		hidden	= vim.eval("&hidden")
+		vim.command("set hidden")
+
+		pointer	= 0
+		while optional:
+			buf, match	= optional[pointer]
+			if vim.current.buffer.number != buf.buffer.number:
+				vim.current.buffer	= buf.buffer
+			action	= buf.interactive(match[0], match[1], msg % (pointer + 1,
+					len(optional), buf.buffer.name), choices, 0)
+			if action in (1, 2):
+				if action == 1:
+					buf.patch([match])
+				self.__switch(buf)
+				self.remember([match], action == 1)
+				del optional[pointer]
+				if pointer >= len(optional):
+					pointer	= 0
+			elif action == 3:
+				for i in buffers:
+					self.__switch(i)
+					matches	= [j for b, j in optional if b is i]
+					self.apply(matches, i)
+					self.remember(matches, True)
+				break
+			elif action == 4:
+				pointer	= (pointer - 1) % len(optional)
+			elif action == 5:
+				pointer	= (pointer + 1) % len(optional)
+			else:
+				break
+
+		vim.command("let &hidden = %s" % hidden)
+		if vim.current.buffer.number != current.buffer.number:
+			vim.current.buffer	= current.buffer
+		for i in buffers:
+			i.vim2py()
+		self.__switch(current)
+
+	def __switch(self, buf):
+		# makes BUF current buffer of spellchecker with decision
+		# memory of its own project
+		self.buffer	= buf
+		if self.memory is not None:
+			self.open_memory()
+
+#----SLICEDSCAN----
+
+class SlicedScan:
+	"""
+	Scan of one dictionary, which is done by small steps: visible
+	lines first, then blocks of lines below and above them in turn,
+	so the words near the cursor are found first
+
+	instance.ranges		(first, last) lines, which are not scanned yet
+				(only the next block of each side is kept)
+	instance.done		True, when all the lines are scanned
+	"""
+	def __init__(self, spellchecker, table):
+		self.spellchecker	= spellchecker
+		self.table		= table
+
+		self.lo		= spellchecker.first
+		self.hi		= len(spellchecker.buffer.buffer)
+		if spellchecker.last is not None:
+			self.hi	= min(spellchecker.last, self.hi)
+
+		top	= int(vim.eval("line('w0')")) - 1
+		bottom	= int(vim.eval("line('w$')"))
+		top	= min(max(top, self.lo), self.hi)
+		bottom	= min(max(bottom, top), self.hi)
+
+		self.above	= top
+		self.below	= bottom
+		self.turn	= True
+		self.ranges	= [(top, bottom)] if bottom > top else []
+		self.done	= False
+
+	def __next_range(self):
+		if self.ranges:
+			return self.ranges.pop()
+		size	= self.spellchecker.slice_lines
+		below	= self.below < self.hi
+		above	= self.above > self.lo
+		if not below and not above:
+			return None
+		self.turn	= not self.turn
+		# blocks clamped at LO or HI are shorter: they must not
+		# reach lines, which are scanned already
+		if below and (self.turn or not above):
+			first, self.below	= self.below, min(self.below + size, self.hi)
+			return first, self.below
+		last, self.above	= self.above, max(self.above - size, self.lo)
+		return self.above, last
+
+	def step(self, budget):
+		"""
+		Return:		list
+
+		Scans blocks of lines until BUDGET seconds are spent
+		(at least one block) and returns their candidates, which
+		are left after decision memory and context model
+		"""
+		spellchecker	= self.spellchecker
+		first, last	= spellchecker.first, spellchecker.last
+		deadline	= time.perf_counter() + budget
+		result		= []
+		try:
+			while not self.done:
+				block	= self.__next_range()
+				self.done	= not self.ranges and\
+					self.below >= self.hi and self.above <= self.lo
+				if block is None:
+					break
+				spellchecker.first	= max(block[0], self.lo)
+				spellchecker.last	= min(block[1], self.hi)
+				matches	= spellchecker.memory_correction(
+						spellchecker.candidates(self.table))
+				if matches and spellchecker.context is not None:
+					matches	= spellchecker.context_correction(matches)
+				result.extend(matches)
+				if time.perf_counter() >= deadline:
+					break
+		finally:
+			spellchecker.first, spellchecker.last	= first, last
+		return result
+
+#----POPUPREVIEW----
+
+class PopupReview:
+	"""
+	Non-modal review of optional words: every word is offered in
+	vim's popup menu, vim stays responsive and calls callback()
+	with the chosen item
+
+	While user looks at one word, cursor position, highlight and
+	title of the neighbouring words are prepared, so moving to
+	them costs only showing
+
+	With SCAN (SlicedScan) the review starts from the words found
+	near the cursor, and the rest are added by vim timer, while
+	user is choosing (see start())
+	"""
+	CHOICES	= ["Correct", "Keep", "All", "Previous", "Next", "Exit"]
+
+	def __init__(self, spellchecker, matches, scan=None):
+		self.spellchecker	= spellchecker
+		self.buffer		= spellchecker.buffer
+		self.matches		= matches
+		self.pointer		= 0
+		self.prepared		= {}
+		self.highlight		= None
+		self.menu		= None
+
+		self.scan		= scan
+		self.timer		= None
+		self.entry		= 0
+		self.found		= 0
+		# "All" was chosen before scan was finished
+		self.all		= False
+
+	def prepare(self, pointer):
+		"""
+		Return:		tuple
+
+		Returns (cursor, highlight positions, title) for the word
+		number POINTER
+		"""
+		start, end, replacement, line, column	= self.matches[pointer][:5]
+		title	= " %s? (%d of %d%s) " % (replacement.decode(self.buffer.encoding),
+				pointer + 1, len(self.matches), self.__scanning())
+		return (line + 1, column), [[line + 1, column + 1, end - start]], title
+
+	def show(self):
+		"""
+		Return:		None
+
+		Highlights current word and opens popup menu near it
+		"""
+		view	= self.prepared.get(self.pointer) or self.prepare(self.pointer)
+		cursor, positions, title	= view
+
+		self.clear()
+		vim.current.window.cursor	= cursor
+		self.highlight	= vim.Function("matchaddpos")("IncSearch", positions)
+		self.menu	= vim.Function("popup_menu")(self.CHOICES, {
+			"title"		: title,
+			"line"		: "cursor+1",
+			"col"		: "cursor",
+			"callback"	: "g:YoPopupCallback"})
+
+		# prefetch neighbours while user is choosing
+		self.prepared	= {}
+		for i in (self.pointer + 1, self.pointer - 1):
+			i	%= len(self.matches)
+			self.prepared[i]	= self.prepare(i)
+
+	def __scanning(self):
+		return "+" if self.scan is not None and not self.scan.done else ""
+
+	def start(self):
+		"""
+		Return:		None
+
+		Scans the first slice (visible lines) and shows the word
+		nearest to the cursor. The rest is scanned by vim timer,
+		which calls step()
+		"""
+		line, column	= vim.current.window.cursor
+		self.entry	= self.buffer.line_offset(line - 1) + column
+		# visible lines only: the first word is shown at once
+		self.step(0)
+		if _review is self and not self.scan.done:
+			self.timer	= vim.Function("timer_start")(
+					max(int(self.spellchecker.slice), 1),
+					"g:YoScanStep", {"repeat": -1})
+
+	def step(self, budget=None):
+		"""
+		Return:		None
+
+		Scans the next slice (BUDGET seconds, self.spellchecker.slice
+		by default) and adds its words to review
+		"""
+		if budget is None:
+			budget	= self.spellchecker.slice / 1000.0
+		matches	= self.scan.step(budget)
+		self.found += len(matches)
+		if self.all:
+			self.__correct_all(matches)
+			matches	= []
+
+		if matches:
+			# words of a slice follow one another: sorting only merges them
+			current	= self.matches[self.pointer] if self.menu is not None else None
+			self.matches	= sorted(self.matches + matches)
+			if current is not None:
+				self.pointer	= self.matches.index(current)
+
+		if self.scan.done and self.timer is not None:
+			vim.Function("timer_stop")(self.timer)
+			self.timer	= None
+
+		if self.menu is None:
+			if self.matches and not self.all:
+				self.pointer	= min(range(len(self.matches)),
+					key=lambda i: abs(self.matches[i][0] - self.entry))
+				self.show()
+			elif self.scan.done:
+				if not self.found:
+					print("No words, written without optional YO were found!")
+				self.finish()
+		else:
+			# numbers in titles are changed
+			self.prepared	= {}
+			view	= self.prepare(self.pointer)
+			vim.Function("popup_setoptions")(self.menu, {"title": view[2]})
+
+	def __correct_all(self, matches):
+		matches	= [i for i in matches if self.spellchecker.valid(i)]
+		self.spellchecker.apply(matches, self.buffer)
+		self.spellchecker.remember(matches, True)
+
+	def clear(self):
+		"""
+		Return:		None
+
+		Removes highlight of the word
+		"""
+		if self.highlight is not None:
+			vim.Function("matchdelete")(self.highlight)
+			self.highlight	= None
+
+	def callback(self, result):
+		"""
+		Return:		bool
+
+		Applies menu item number RESULT (1-leader, -1 if menu was
+		closed) and shows next word. Returns False, when review
+		is finished
+		"""
+		self.menu	= None
+		match	= self.matches[self.pointer]
+		if result in (1, 2):
+			if result == 1 and self.spellchecker.valid(match):
+				self.buffer.patch([match])
+			self.spellchecker.remember([match], result == 1)
+			del self.matches[self.pointer]
+			if self.pointer >= len(self.matches):
+				self.pointer	= 0
+			# numbers in titles are changed
+			self.prepared	= {}
+		elif result == 3:
+			self.__correct_all(self.matches)
+			self.matches	= []
+			self.all	= True
+		elif result == 4:
+			self.pointer	= (self.pointer - 1) % len(self.matches)
+		elif result == 5:
+			self.pointer	= (self.pointer + 1) % len(self.matches)
+		else:
+			self.matches	= []
+			if self.scan is not None:
+				# words, which are not scanned yet, are not needed
+				self.scan.done	= True
+
+		if self.matches:
+			self.show()
+			return True
+		if self.scan is not None and not self.scan.done:
+			# wait for the words, which are not scanned yet
+			self.clear()
+			return True
+		self.finish()
+		return False
+
+	def finish(self):
+		"""
+		Return:		None
+
+		Ends review
+		"""
+		global _review
+
+		if self.timer is not None:
+			vim.Function("timer_stop")(self.timer)
+			self.timer	= None
+		self.clear()
+		self.buffer.vim2py()
+		self.spellchecker.close_memory()
+		_review	= None
+
+#----SCRATCHREVIEW----
+
+class ScratchReview:
+	"""
+	Review of optional words in a scratch buffer: every word is one
+	line with its number, position, word with YO and context
+
+		+ 7 | 12:5 | всё | ...и [все] это было...
+
+	User marks lines by '+' (correct) or '-' (keep) or deletes them
+	(keep) with usual editing commands, and :YoApply corrects all
+	the marked words at once, as one undo step
+	"""
+	MARK	= re.compile(r"^\s*([+-])\s*(\d+)\s*\|")
+	WIDTH	= 30
+
+	def __init__(self, spellchecker, matches, marks):
+		self.spellchecker	= spellchecker
+		self.buffer		= spellchecker.buffer
+		self.matches		= matches
+		self.marks		= marks
+		self.number		= None
+
+	def line(self, i, data=None):
+		"""
+		Return:		str
+
+		Returns line of scratch buffer for the word number I, which
+		is in buffer line DATA (it is taken from vim by default)
+		"""
+		start, end, replacement, line, column	= self.matches[i][:5]
+		encoding	= self.buffer.encoding
+		if data is None:
+			data	= self.buffer.encoded_line(line)
+		left	= data[:column].decode(encoding, "ignore")[-self.WIDTH:]
+		word	= data[column:column + end - start].decode(encoding, "ignore")
+		right	= data[column + end - start:].decode(encoding, "ignore")[:self.WIDTH]
+		return "%s %d | %d:%d | %s | ...%s[%s]%s..." % ("+" if self.marks[i] else "-",
+			i + 1, line + 1, column + 1, replacement.decode(encoding),
+			left, word, right)
+
+	def open(self):
+		"""
+		Return:		None
+
+		Opens scratch buffer with all the words
+		"""
+		lines	= ['" %d words: "+" - correct, "-" or deleted line - keep,'\
+				' :YoApply - apply' % len(self.matches)]
+		found	= self.buffer.encoded_lines_at(i[3] for i in self.matches)
+		lines	+= [self.line(i, found[match[3]]) for i, match in enumerate(self.matches)]
+
+		vim.command("botright new")
+		vim.command("setlocal buftype=nofile bufhidden=wipe noswapfile nobuflisted")
+		vim.command("setlocal filetype=yoreview")
+		vim.current.buffer[:]	= lines
+		vim.command("setlocal nomodified")
+		vim.command("command! -buffer YoApply call g:YoApply()")
+		self.number	= vim.current.buffer.number
+		_scratch[self.number]	= self
+
+	def decisions(self):
+		"""
+		Return:		tuple
+
+		Returns (indexes of words to correct, indexes of words
+		to keep) by the lines of scratch buffer
+		"""
+		marks	= {}
+		for i in vim.buffers[self.number]:
+			match	= self.MARK.match(i)
+			if match and 0 < int(match.group(2)) <= len(self.matches):
+				marks[int(match.group(2)) - 1]	= match.group(1) == "+"
+		correct	= [i for i in sorted(marks) if marks[i]]
+		keep	= [i for i in range(len(self.matches)) if not marks.get(i)]
+		return correct, keep
+
+	def apply(self):
+		"""
+		Return:		None
+
+		Corrects marked words of the source buffer, which were not
+		changed since review was opened, and closes scratch buffer
+		"""
+		correct, keep	= self.decisions()
+		del _scratch[self.number]
+		vim.command("bwipeout! %d" % self.number)
+
+		number	= self.buffer.buffer.number
+		window	= int(vim.eval("bufwinnr(%d)" % number))
+		if window > 0:
+			vim.command("%dwincmd w" % window)
+		else:
+			vim.command("buffer %d" % number)
+
+		spellchecker	= self.spellchecker
+		spellchecker.buffer	= self.buffer
+		correct	= [self.matches[i] for i in correct]
+		keep	= [self.matches[i] for i in keep]
+		matches	= [i for i in correct if spellchecker.valid(i)]
+
+		# one command changes buffer, so it is one undo step
+		spellchecker.apply(matches, self.buffer)
+		self.buffer.vim2py()
+
+		spellchecker.open_memory()
+		try:
+			spellchecker.remember(matches, True)
+			spellchecker.remember(keep, False)
+		finally:
+			spellchecker.close_memory()
+		print("%d words were corrected and %d were kept"\
+				% (len(matches), len(keep)))
+
+#----GLOBAL VARS----
+
+# scratch buffers of reviews by their numbers
+_scratch	= {}
+
+# review in popup menu, which waits for user's choice
+_review		= None
+
+# spellchecker is kept between runs, so the words are read only once
+_spellchecker	= None
+
+# thresholds of strategies on this machine (see strategy.py)
+_calibration	= None
+
+def get_spellchecker(buf):
+	"""
+	Return:		YoSpellchecker
+
+	Returns spellchecker for BUF with up-to-date words
+	"""
+	global _spellchecker
+
+	path	= os.path.splitext(vim.eval("g:vim_yo_dict"))[0]
+	if _spellchecker is None or _spellchecker.yo_path != path:
+		_spellchecker	= YoSpellchecker(path, buf)
+		_spellchecker.shard_dir	= vim.eval("get(g:, 'vim_yo_shards', '%s')"
+				% _user_dir("XDG_CACHE_HOME", "~/.cache", "shards"))
+		_spellchecker.tiered_dir	= vim.eval("get(g:, 'vim_yo_tiered', '')")
+		_spellchecker.hot_entries	= int(vim.eval(
+				"get(g:, 'vim_yo_hot_entries', %d)" % tiered.HOT_ENTRIES))
+		_spellchecker.hot_bytes	= int(vim.eval(
+				"get(g:, 'vim_yo_hot_bytes', %d)" % tiered.HOT_BYTES))
+		_spellchecker.read_txt()
+		_spellchecker.read_ctx()
+	else:
+		_spellchecker.buffer	= buf
+		_spellchecker.update_txt()
+
+	_spellchecker.first	= 0
+	_spellchecker.last	= None
+	_spellchecker.contexts.clear()
+	# thresholds of this machine (see strategy.py), user's values
+	# take precedence
+	thresholds	= _thresholds()
+	_spellchecker.parallel	= int(vim.eval("get(g:, 'vim_yo_parallel', %d)"
+					% thresholds["parallel"]))
+	_spellchecker.vector	= int(vim.eval("get(g:, 'vim_yo_vector', %d)"
+					% thresholds["vector"]))
+	_spellchecker.incremental	= int(vim.eval("get(g:, 'vim_yo_incremental', %d)"
+					% thresholds["incremental"]))
+	_spellchecker.scanning	= vim.eval("get(g:, 'vim_yo_strategy', '')")
+	_spellchecker.native	= int(vim.eval("get(g:, 'vim_yo_native', 1000)"))
+	_spellchecker.protect	= bool(int(vim.eval("get(g:, 'vim_yo_protect', 1)")))
+	_spellchecker.memory_dir	= vim.eval("get(g:, 'vim_yo_memory', '%s')"
+			% _user_dir("XDG_DATA_HOME", "~/.local/share", "memory"))
+	_spellchecker.context_threshold	= float(vim.eval(
+			"get(g:, 'vim_yo_context_threshold', '0.95')"))
+	_spellchecker.popup	= bool(int(vim.eval(
+			"has('popupwin') && get(g:, 'vim_yo_popup', 1)")))
+	_spellchecker.slice	= float(vim.eval(
+			"has('timers') ? get(g:, 'vim_yo_slice', 10) : 0"))
+	return _spellchecker
+
+def _thresholds():
+	"""
+	Return:		dict
+
+	Returns thresholds of strategies, which were measured on this
+	machine, or the default ones
+	"""
+	global _calibration
+
+	if _calibration is None:
+		path	= vim.eval("get(g:, 'vim_yo_calibration', "\
+				"g:vim_yo_path . '/calibration.json')")
+		_calibration	= strategy.load(path) or dict(strategy.DEFAULTS)
+	return _calibration
+
+def popup_callback(result):
+	"""
+	Return:		None
+
+	Called by vim, when item of popup menu is chosen
+	"""
+	if _review is not None:
+		_review.callback(result)
+
+def scan_step():
+	"""
+	Return:		None
+
+	Called by vim timer: scans the next slice of popup review
+	"""
+	if _review is not None and _review.scan is not None:
+		_review.step()
+
+def forget(number):
+	"""
+	Return:		None
+
+	Called by vim, when buffer NUMBER is wiped out: its number may
+	be given to another buffer, which was not checked
+	"""
+	if _spellchecker is not None:
+		_spellchecker.history	= set(i for i in _spellchecker.history
+						if i[0] != number)
+
+def poll():
+	"""
+	Return:		None
+
+	Called by vim timer: prepares changes of .txt file in the
+	background, so the next run applies only them
+	"""
+	if _spellchecker is not None:
+		_spellchecker.watch_txt()
+
+def _start(first=None, last=None):
+	"""
+	Return:		YoSpellchecker
+
+	Returns spellchecker of current buffer for lines from FIRST to
+	LAST (vim notation, 1-leader) or for the whole buffer and ends
+	review in popup menu, if it was not finished
+	"""
+	buf		= buffer.Buffer(vim.current.buffer, stream=True)
+	spellchecker	= get_spellchecker(buf)
+
+	if first is not None:
+		spellchecker.first	= first - 1
+		spellchecker.last	= last
+
+	if _review is not None:
+		_review.finish()
+	return spellchecker
+
+def main(first=None, last=None):
+	"""
+	Return:		None
+
+	Checks lines from FIRST to LAST (vim notation, 1-leader)
+	or the whole buffer
+	"""
+	spellchecker	= _start(first, last)
+	spellchecker.open_memory()
+	try:
+		spellchecker.necessary_correction()
+		spellchecker.optional_correction()
+	finally:
+		# popup review closes memory itself, when it is finished
+		if _review is None:
+			spellchecker.close_memory()
+
+def main_review(first=None, last=None):
+	"""
+	Return:		None
+
+	Corrects necessary words of lines from FIRST to LAST (or of the
+	whole buffer) and lists optional ones in a scratch buffer
+	"""
+	spellchecker	= _start(first, last)
+	spellchecker.open_memory()
+	try:
+		spellchecker.necessary_correction()
+		spellchecker.scratch_correction()
+	finally:
+		spellchecker.close_memory()
+
+def main_group(first=None, last=None):
+	"""
+	Return:		None
+
+	Corrects necessary words of lines from FIRST to LAST (or of the
+	whole buffer) and asks about optional ones word by word
+	"""
+	spellchecker	= _start(first, last)
+	spellchecker.open_memory()
+	try:
+		spellchecker.necessary_correction()
+		spellchecker.group_correction()
+	finally:
+		spellchecker.close_memory()
+
+def apply_review():
+	"""
+	Return:		None
+
+	Applies review of current scratch buffer
+	"""
+	review	= _scratch.get(vim.current.buffer.number)
+	if review is None:
+		print("This buffer is not a review of YO words!")
+		return
+	review.apply()
+
+def main_stats():
+	"""
+	Return:		None
+
+	Prints counters of dictionary lookups
+	"""
+	if _spellchecker is None:
+		print("Dictionary is not loaded yet")
+		return
+	for name in ("necessary", "optional"):
+		table	= getattr(_spellchecker, name)
+		if isinstance(table, tiered.TieredTable):
+			print("%s: %s" % (name, table.stats()))
+		else:
+			print("%s: %d words in memory" % (name, len(table)))
+	thresholds	= ", ".join("%s from %s" % (name, "%d KB" % (value >> 10)
+			if value else "never") for name, value in (("vector",
+			_spellchecker.vector), ("parallel", _spellchecker.parallel),
+			("incremental", _spellchecker.incremental)))
+	print("last scanning: %s (%s), chunks: %d cached, %d hits, %d misses" % (
+		_spellchecker.chosen or "none", thresholds, len(_spellchecker.chunks.cache),
+		_spellchecker.chunks.hits, _spellchecker.chunks.misses))
+
+def main_calibrate():
+	"""
+	Return:		None
+
+	Measures scanning strategies on this machine and stores their
+	thresholds in calibration file (see strategy.py)
+	"""
+	global _calibration
+
+	path	= vim.eval("get(g:, 'vim_yo_calibration', g:vim_yo_path . '/calibration.json')")
+	txt	= os.path.splitext(vim.eval("g:vim_yo_dict"))[0] + ".txt"
+	print("Measuring scanning strategies, it takes a few seconds...")
+	vim.command("redraw")
+	optional, necessary	= spellfile.read_txt(txt)
+	_calibration	= strategy.calibrate(optional, necessary, report=lambda line: None)
+	strategy.save(path, _calibration)
+	del optional, necessary
+	print("%s: %s" % (strategy.machine(), ", ".join("%s from %s" % (name,
+		"%d KB" % (value >> 10) if value else "never")
+		for name, value in sorted(_calibration.items()))))
+
+def main_all(*patterns):
+	"""
+	Return:		None
+
+	Checks every listed buffer or, if PATTERNS are given, every file
+	matching them. Files are loaded into hidden buffers, which are
+	left modified
+	"""
+	if patterns:
+		numbers	= []
+		for pattern in patterns:
+			for path in sorted(glob.glob(os.path.expanduser(pattern))):
+				if not os.path.isfile(path):
+					continue
+				vim.vars["vim_yo_file"]	= path
+				vim.command("execute 'badd' fnameescape(g:vim_yo_file)")
+				numbers.append(int(vim.eval("bufnr(g:vim_yo_file)")))
+	else:
+		numbers	= [i.number for i in vim.buffers
+				if int(vim.eval("buflisted(%d)" % i.number))
+				and not i.options["buftype"]]
+
+	buffers	= []
+	for i in numbers:
+		vim.command("call bufload(%d)" % i)
+		buffers.append(buffer.Buffer(vim.buffers[i], stream=True))
+	if not buffers:
+		return
+
+	# window is left with the buffer it had, not with the first of
+	# hidden files
+	shown	= vim.current.buffer
+	current	= [i for i in buffers if i.buffer.number == shown.number]
+	spellchecker	= get_spellchecker(current[0] if current else buffers[0])
+	spellchecker.open_memory()
+	try:
+		spellchecker.batch_correction(buffers)
+	finally:
+		spellchecker.close_memory()
+		if vim.current.buffer.number != shown.number:
+			vim.current.buffer	= shown
+
+def main_spell():
+	"""
+	Return:		None
 
-def main():
-	import re
+	Turns on vim's spell checking of words without YO in current
+	window. Spell file is built from the words of spellchecker
+	into g:vim_yo_path/spell, when it is older than .txt file
+	"""
+	buf		= buffer.Buffer(vim.current.buffer, stream=True)
+	spellchecker	= get_spellchecker(buf)
 
-	path		= os.path.splitext(vim.eval("g:vim_yo_dict"))[0]
-	buf		= buffer.Buffer()
-	spellchecker	= YoSpellchecker(path, buf)
+	root	= vim.eval("g:vim_yo_path")
+	path	= os.path.join(root, "spell", "yo")
+	spl	= "%s.%s.spl" % (path, vim.eval("&encoding"))
 
-	spellchecker.read_txt()
+	if not os.path.exists(spl) or os.path.getmtime(spl) < spellchecker.txt_stat[0]:
+		print("Building spell file...")
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		spellchecker.load_shards()
+		optional, necessary	= spellchecker.optional, spellchecker.necessary
+		if spellchecker.tiered_dir:
+			optional, necessary	= spellfile.read_txt(spellchecker.yo_txt)
+		spell	= spellfile.SpellFile()
+		spell.add(necessary)
+		spell.add(optional,
+			bool(int(vim.eval("get(g:, 'vim_yo_spell_optional', 0)"))))
+		spell.write(path)
+		vim.vars["vim_yo_file"]	= path
+		vim.command("execute 'silent mkspell!' fnameescape(g:vim_yo_file) fnameescape(g:vim_yo_file)")
 
-	spellchecker.necessary_correction()
-	spellchecker.optional_correction()
+	if root not in vim.eval("&runtimepath").split(","):
+		vim.command("execute 'set runtimepath+=' . fnameescape(g:vim_yo_path)")
+	vim.command("setlocal spell")
+	if "yo" not in vim.eval("&l:spelllang").split(","):
+		vim.command("setlocal spelllang+=yo")
@@ -0,0 +1,158 @@
+"""
+Export of yo dictionary to vim's spell file sources (.aff and .dic)
+
+Words with YO are written as good words, words without necessary YO
+(and, if asked, without optional YO) are written as bad ones, so vim
+highlights them with SpellBad, ']s' stops at them and 'z=' suggests
+the word with YO. Bad words of this file win over good words of other
+languages in 'spelllang', so it is used together with them:
+
+	python3 spellfile.py yo.txt spell/yo
+	:mkspell! spell/yo spell/yo
+	:set runtimepath+=. spell spelllang=ru,yo
+
+Words are compressed with suffix classes: words with a common stem
+share one dictionary line and the set of their endings becomes one
+SFX class of .aff file
+
+This module does not need vim
+"""
+import sys
+
+#----GLOBAL VARS----
+
+SUFFIX_MAX	= 4
+STEM_MIN	= 2
+
+FLAG_BAD	= 1
+FLAG_NEEDAFFIX	= 2
+FLAG_FIRST	= 10
+
+#----AUXILLIARY FUNCS----
+
+def _paradigms(words):
+	"""
+	Return:		dict
+
+	Splits WORDS into stems and endings: returns {stem: endings}
+	Every word goes to the stem, which is shared by most words
+	"""
+	stems	= {}
+	for word in words:
+		for i in range(min(SUFFIX_MAX, len(word) - STEM_MIN) + 1):
+			stem	= word[:len(word) - i]
+			stems[stem] = stems.get(stem, 0) + 1
+
+	result	= {}
+	for word in words:
+		best	= word
+		for i in range(1, min(SUFFIX_MAX, len(word) - STEM_MIN) + 1):
+			stem	= word[:len(word) - i]
+			if stems[stem] > stems[best]:
+				best	= stem
+		result.setdefault(best, set()).add(word[len(best):])
+	return result
+
+def read_txt(path):
+	"""
+	Return:		tuple
+
+	Reads (optional, necessary) dictionaries {word with 'е': word
+	with 'ё'} from yo.txt
+	"""
+	optional	= {}
+	necessary	= {}
+	with open(path, "r", encoding="utf-8") as file:
+		for i in file:
+			if i.startswith("*"):
+				word	= i[2:].strip()
+				table	= optional
+			else:
+				word	= i.strip()
+				table	= necessary
+			if word:
+				table[word.replace("ё", "е")] = word
+	return optional, necessary
+
+#----SPELLFILE----
+
+class SpellFile:
+	"""
+	Collects words and writes them as .aff and .dic files
+
+	instance.good		words, which are right
+	instance.bad		words, which are wrong
+	"""
+	def __init__(self):
+		self.good	= set()
+		self.bad	= set()
+
+	def add(self, table, bad=True):
+		"""
+		Return:		None
+
+		Adds words of the TABLE dictionary {word with 'е':
+		word with 'ё'}. Keys are added as bad words, if BAD
+		"""
+		self.good.update(table.values())
+		if bad:
+			self.bad.update(table)
+
+	def write(self, path):
+		"""
+		Return:		int
+
+		Writes PATH.aff and PATH.dic, returns number of lines of .dic
+		"""
+		classes	= {}
+		lines	= []
+
+		bad	= self.bad - self.good
+		for words, flags in ((self.good, []), (bad, [FLAG_BAD])):
+			for stem, endings in sorted(_paradigms(words).items()):
+				if endings == {""}:
+					if flags:
+						stem	= "%s/%s" % (stem, ",".join(map(str, flags)))
+					lines.append(stem)
+					continue
+				endings	= frozenset(endings)
+				if endings not in classes:
+					classes[endings] = FLAG_FIRST + len(classes)
+				result	= flags + [classes[endings]]
+				if "" not in endings:
+					result	= result + [FLAG_NEEDAFFIX]
+				lines.append("%s/%s" % (stem, ",".join(map(str, result))))
+
+		with open(path + ".aff", "w", encoding="utf-8") as file:
+			file.write("SET UTF-8\n")
+			file.write("FLAG num\n")
+			file.write("BAD %d\n" % FLAG_BAD)
+			file.write("NEEDAFFIX %d\n" % FLAG_NEEDAFFIX)
+			file.write("REP 2\nREP е ё\nREP Е Ё\n")
+			for endings, flag in sorted(classes.items(), key=lambda x: x[1]):
+				endings	= sorted(i for i in endings if i)
+				file.write("\nSFX %d Y %d\n" % (flag, len(endings)))
+				for i in endings:
+					file.write("SFX %d 0 %s .\n" % (flag, i))
+
+		with open(path + ".dic", "w", encoding="utf-8") as file:
+			file.write("%d\n" % len(lines))
+			file.write("\n".join(lines) + "\n")
+		return len(lines)
+
+def main(argv=sys.argv):
+	if len(argv) < 3:
+		print("Usage: %s yo.txt output [--optional]" % argv[0])
+		return 1
+
+	optional, necessary	= read_txt(argv[1])
+	spell	= SpellFile()
+	spell.add(necessary)
+	spell.add(optional, "--optional" in argv[3:])
+	counter	= spell.write(argv[2])
+	print("%d words written into %d lines of %s.dic" % (
+		len(spell.good | spell.bad), counter, argv[2]))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
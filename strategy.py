@@ -0,0 +1,396 @@
+"""
+Scanning strategies and their choice by size of the text and history
+
+	lines		words of every line are found by regular expression
+			and looked up in dictionary (engine.ByteEngine)
+	vector		the text is scanned at once by NumPy (vector.py)
+	parallel	parts of the text are scanned by forked processes
+			(engine.parallel_scan())
+	incremental	lines are scanned by chunks, candidates of every
+			chunk are cached by its content, so a text checked
+			again costs hashing of its chunks and scanning of
+			the changed ones (Incremental)
+
+Sizes of texts, from which vector, parallel and incremental scanning
+pay off, depend on the machine. They are measured once by
+
+	python3 strategy.py yo.txt [--corpus corpus.txt]
+
+(or :YoCalibrate in vim) and stored in calibration file under the name
+of the machine, so one file may be shared by several machines. The
+threshold of a strategy is the smallest measured size, from which it
+is faster than simpler ones. If it is slower at the largest measured
+size, times are extrapolated by lines (fixed cost + cost of a byte).
+Without calibration DEFAULTS are used
+
+This module does not need vim
+"""
+import os, sys, time, json, zlib, random, hashlib, platform, argparse
+from collections import OrderedDict
+
+import engine, regions, vector
+
+#----GLOBAL VARS----
+
+STRATEGIES	= ("lines", "vector", "parallel", "incremental")
+
+# thresholds in bytes (0 - never)
+DEFAULTS	= {
+	"vector"	: 1 << 20,
+	"parallel"	: 32 << 20,
+	"incremental"	: 256 << 10,
+}
+
+SIZES		= (4 << 10, 16 << 10, 64 << 10, 256 << 10, 1 << 20, 4 << 20)
+
+# chunk of lines ends after a line with (crc32 & CHUNK_MASK) == 0,
+# so chunks stay the same, when lines are inserted before them
+CHUNK_MASK	= 63
+CHUNK_LINES	= 256
+CHUNKS		= 1 << 14
+
+#----AUXILLIARY FUNCS----
+
+def machine():
+	"""
+	Return:		str
+
+	Returns name of this machine and of things, which change speed
+	of strategies
+	"""
+	return "%s/%s/%dcpu/py%d.%d/numpy-%s" % (platform.node(), platform.machine(),
+		os.cpu_count() or 1, sys.version_info[0], sys.version_info[1],
+		vector.numpy.__version__ if vector.available() else "none")
+
+def load(path):
+	"""
+	Return:		dict | None
+
+	Returns thresholds of this machine from calibration file PATH
+	or None, if the machine was not calibrated
+	"""
+	try:
+		with open(path, "r") as file:
+			result	= json.load(file).get(machine())
+	except (OSError, ValueError, AttributeError):
+		return None
+	if not isinstance(result, dict):
+		return None
+	return dict((i, int(result.get(i, DEFAULTS[i]))) for i in DEFAULTS)
+
+def save(path, thresholds):
+	"""
+	Return:		None
+
+	Stores THRESHOLDS of this machine in calibration file PATH,
+	thresholds of other machines are kept
+	"""
+	try:
+		with open(path, "r") as file:
+			machines	= json.load(file)
+	except (OSError, ValueError):
+		machines	= {}
+	if not isinstance(machines, dict):
+		machines	= {}
+	machines[machine()]	= dict(thresholds, calibrated=time.strftime("%Y-%m-%d %H:%M:%S"))
+	folder	= os.path.dirname(path)
+	if folder:
+		os.makedirs(folder, exist_ok=True)
+	with open(path + ".tmp", "w") as file:
+		json.dump(machines, file, indent=1, sort_keys=True)
+	os.replace(path + ".tmp", path)
+
+def choose(size, thresholds, checked=False, vectorized=True, forced=""):
+	"""
+	Return:		str
+
+	Returns strategy for text of SIZE bytes by THRESHOLDS. Texts,
+	which were CHECKED before, are scanned incrementally: cached
+	chunks are cheaper than scanning anew. The first scan fills
+	the cache, so it is never incremental. VECTORIZED is False,
+	if vector scanning is not possible. FORCED strategy is returned
+	as is, if it is possible
+	"""
+	if forced in STRATEGIES and (forced != "vector" or vectorized):
+		return forced
+	incremental	= thresholds.get("incremental", 0)
+	if checked and incremental and size >= incremental:
+		return "incremental"
+	parallel	= thresholds.get("parallel", 0)
+	if parallel and size >= parallel:
+		return "parallel"
+	limit	= thresholds.get("vector", 0)
+	if vectorized and limit and size >= limit:
+		return "vector"
+	return "lines"
+
+def _chunks(lines):
+	# lists of (number, line) pairs of LINES cut by their content
+	chunk	= []
+	for number, line in lines:
+		chunk.append((number, line))
+		if not zlib.crc32(line) & CHUNK_MASK or len(chunk) >= CHUNK_LINES:
+			yield chunk
+			chunk	= []
+	if chunk:
+		yield chunk
+
+def _fit(points):
+	# (fixed cost, cost of a byte) of a line by least squares
+	count	= len(points)
+	mean_x	= sum(i[0] for i in points) / count
+	mean_y	= sum(i[1] for i in points) / count
+	spread	= sum((i[0] - mean_x) ** 2 for i in points)
+	slope	= sum((i[0] - mean_x) * (i[1] - mean_y) for i in points) / spread
+	return max(mean_y - slope * mean_x, 0.0), slope
+
+def _crossing(fast, slow):
+	# size, from which FAST (fixed, per byte) line is below SLOW one
+	if fast[1] >= slow[1]:
+		return 0
+	return max(int((fast[0] - slow[0]) / (slow[1] - fast[1])), 1)
+
+def _threshold(fast, slow):
+	# size, from which FAST (size, time) points stay below SLOW ones
+	result	= None
+	for (size, first), (same, second) in zip(fast, slow):
+		if first >= second:
+			result	= None
+		elif result is None:
+			result	= size
+	if result is not None:
+		return result
+	return _crossing(_fit(fast[-2:]), _fit(slow[-2:]))
+
+def _measure(run, part, budget=0.2):
+	# the best time of RUN(PART) in a few runs within BUDGET seconds
+	best	= None
+	spent	= 0.0
+	for i in range(5):
+		timer	= time.perf_counter()
+		run(part)
+		timer	= time.perf_counter() - timer
+		best	= timer if best is None else min(best, timer)
+		spent += timer
+		if spent > budget:
+			break
+	return best
+
+def _sample(optional, necessary, size, seed=1):
+	# lines of text of SIZE bytes: words of the dictionaries among
+	# random words of Cyrillic letters
+	rand	= random.Random(seed)
+	words	= sorted(optional)[::97] + sorted(necessary)[::97]
+	letters	= "абвгдежзийклмнопрстуфхцчшщыьэюя"
+	lines	= []
+	total	= 0
+	while total < size:
+		line	= []
+		for i in range(10):
+			if rand.random() < 0.15 and words:
+				line.append(rand.choice(words))
+			else:
+				line.append("".join(rand.choice(letters)
+						for j in range(rand.randint(2, 9))))
+		line	= (" ".join(line) + ".").encode("utf-8")
+		lines.append(line)
+		total += len(line) + 1
+	return lines
+
+#----INCREMENTAL----
+
+class Incremental:
+	"""
+	Cache of candidates of chunks of lines by their content
+
+	instance.cache		OrderedDict {(encoding, table, hash): [(start, end,
+				replacement, line, column)] relative to chunk} and
+				{("regions", filetype, open block, hash):
+				(regions.RegionIndex, open block after chunk)}
+	instance.hits		number of chunks found in cache
+	instance.misses		number of scanned chunks
+	"""
+	def __init__(self, size=CHUNKS):
+		self.size	= size
+		self.cache	= OrderedDict()
+		self.hits	= 0
+		self.misses	= 0
+
+	def clear(self):
+		"""
+		Return:		None
+
+		Drops cached candidates (dictionary was changed)
+		"""
+		self.cache.clear()
+
+	def __regions(self, lexer, filetype, chunk, digest, newline):
+		# RegionIndex of CHUNK relative to its beginning; it depends
+		# on the state of LEXER (open block) before the chunk
+		key	= ("regions", filetype, lexer.inside, digest)
+		found	= self.cache.get(key)
+		if found is None:
+			index	= regions.RegionIndex()
+			pos	= 0
+			for number, line in chunk:
+				for start, end in lexer.line(line):
+					index.add(pos + start, pos + end)
+				pos += len(line) + newline
+			found	= self.cache[key]	= (index, lexer.inside)
+		else:
+			self.cache.move_to_end(key)
+		lexer.inside	= found[1]
+		return found[0]
+
+	def scan_lines(self, scanner, lines, table, newline=1, offset=0, skip=None,
+			filetype=None):
+		"""
+		Return:		generator
+
+		Works as SCANNER.scan_lines(), but scans only chunks, which
+		are not in cache. Words are looked up before SKIP is checked
+		If FILETYPE is given, words in protected regions of it are
+		dropped, regions of chunks are cached too
+		"""
+		separator	= b"\n" * newline
+		lexer		= None if filetype is None else regions.lexer(filetype)
+		for chunk in _chunks(lines):
+			data	= separator.join(i[1] for i in chunk)
+			digest	= hashlib.blake2b(data, digest_size=16).digest()
+			key	= (scanner.encoding, table, digest)
+			found	= self.cache.get(key)
+			if found is None:
+				self.misses += 1
+				found	= list(scanner.scan_lines(enumerate(i[1] for i in chunk),
+						table, newline))
+				self.cache[key]	= found
+			else:
+				self.hits += 1
+				self.cache.move_to_end(key)
+
+			index	= None
+			if lexer is not None:
+				index	= self.__regions(lexer, filetype, chunk, digest, newline)
+			while len(self.cache) > self.size:
+				self.cache.popitem(last=False)
+
+			first	= chunk[0][0]
+			for start, end, replacement, line, column in found:
+				if index and index.protects(start, end):
+					continue
+				if skip is None or not skip(offset + start, offset + end):
+					yield (offset + start, offset + end, replacement,
+						first + line, column)
+			offset += len(data) + newline
+
+#----CALIBRATION----
+
+def calibrate(optional, necessary, lines=None, sizes=SIZES, report=print):
+	"""
+	Return:		dict
+
+	Measures strategies on LINES (bytes in utf-8, random text by
+	default) cut to SIZES and returns thresholds of this machine
+	Incremental scanning is chosen only for texts checked before,
+	so its threshold is measured with filled cache; the first scan
+	with empty cache is only reported
+	"""
+	if lines is None:
+		lines	= _sample(optional, necessary, max(sizes))
+	scanner	= engine.ByteEngine("utf-8", optional=optional, necessary=necessary)
+	strategies	= OrderedDict()
+
+	def scan_lines(part):
+		for table in engine.KINDS:
+			list(scanner.scan_lines(enumerate(part), table))
+	strategies["lines"]	= scan_lines
+
+	if vector.available():
+		fast	= vector.VectorEngine("utf-8", optional=optional, necessary=necessary)
+		def scan_vector(part):
+			data	= b"\n".join(part)
+			for table in engine.KINDS:
+				fast.scan(data, table)
+		strategies["vector"]	= scan_vector
+
+	if (os.cpu_count() or 1) > 1 and hasattr(os, "fork"):
+		def scan_parallel(part):
+			data	= b"\n".join(part)
+			for table in engine.KINDS:
+				engine.parallel_scan(scanner, data, table)
+		strategies["parallel"]	= scan_parallel
+
+	def scan_again(part):
+		for table in engine.KINDS:
+			list(cache.scan_lines(scanner, enumerate(part), table))
+	strategies["incremental"]	= scan_again
+
+	def scan_first(part):
+		for table in engine.KINDS:
+			list(Incremental().scan_lines(scanner, enumerate(part), table))
+
+	# scanners build their tables at the first scan
+	cache	= Incremental()
+	for run in strategies.values():
+		run(lines[:16])
+
+	points	= dict((name, []) for name in strategies)
+	for size in sizes:
+		part	= []
+		total	= 0
+		for line in lines:
+			if total >= size:
+				break
+			part.append(line)
+			total += len(line) + 1
+		# the first run fills the cache of incremental scanning
+		cache	= Incremental()
+		scan_again(part)
+		speeds	= []
+		for name, run in strategies.items():
+			best	= _measure(run, part)
+			points[name].append((total, best))
+			speeds.append("%s %.1f MB/s" % (name, total / best / (1 << 20)))
+		best	= _measure(scan_first, part)
+		speeds.append("first incremental %.1f MB/s" % (total / best / (1 << 20)))
+		report("%8d KB: %s" % (total >> 10, ", ".join(speeds)))
+
+	result	= {"vector": 0, "parallel": 0}
+	if "vector" in points:
+		result["vector"]	= _threshold(points["vector"], points["lines"])
+	if "parallel" in points:
+		# parallel scanning competes with the best of the others
+		rivals	= [min(i) for i in zip(points["lines"], points.get("vector", points["lines"]))]
+		result["parallel"]	= _threshold(points["parallel"], rivals)
+	# checked texts are scanned incrementally instead of any other way
+	others	= [min(i) for i in zip(*[points[name] for name in points
+			if name != "incremental"])]
+	result["incremental"]	= _threshold(points["incremental"], others)
+	return result
+
+def main(argv=sys.argv):
+	parser	= argparse.ArgumentParser(prog=argv[0],
+			description="Measures scanning strategies on this machine")
+	parser.add_argument("txt", help="yo.txt")
+	parser.add_argument("--corpus", help="text in utf-8 (random text by default)")
+	parser.add_argument("--output", default=os.path.join(os.path.dirname(
+			os.path.abspath(__file__)), "calibration.json"),
+			help="calibration file")
+	args	= parser.parse_args(argv[1:])
+
+	import spellfile
+	optional, necessary	= spellfile.read_txt(args.txt)
+	lines	= None
+	if args.corpus:
+		with open(args.corpus, "rb") as file:
+			lines	= file.read(max(SIZES) + (1 << 16)).splitlines()
+
+	thresholds	= calibrate(optional, necessary, lines)
+	save(args.output, thresholds)
+	print("%s: %s" % (machine(), ", ".join("%s from %s" % (name,
+		"%d KB" % (value >> 10) if value else "never")
+		for name, value in sorted(thresholds.items()))))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
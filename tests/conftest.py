@@ -0,0 +1,6 @@
+import os, sys
+
+ROOT	= os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules of the plugin are imported by their names, as vim does
+sys.path.insert(0, ROOT)
@@ -0,0 +1,99 @@
+import os, shutil, subprocess
+
+import pytest
+
+import vim, buffer, engine
+
+NECESSARY	= {"еще": "ещё", "ежик": "ёжик", "елка": "ёлка"}
+
+LINES		= ["Еще ежик, еще елка.", "", "ЕЩЕ нет", "ничего", "елка еще ежик"] * 20
+
+def _buffer(lines=LINES):
+	vim.current.buffer	= vim.Buffer(lines)
+	return buffer.Buffer(vim.current.buffer, stream=True)
+
+def _offsets(lines):
+	result	= []
+	offset	= 0
+	for i in lines:
+		result.append(offset)
+		offset += len(i.encode("utf-8")) + 1
+	return result
+
+def _matches(buf):
+	scanner	= engine.ByteEngine("utf-8", optional={}, necessary=NECESSARY)
+	return list(scanner.scan_lines(buf.lines(encoded=True), "necessary"))
+
+def _expected():
+	return [i.replace("Еще", "Ещё").replace("ЕЩЕ", "ЕЩЁ").replace("еще", "ещё")
+		.replace("ежик", "ёжик").replace("елка", "ёлка") for i in LINES]
+
+def test_patch_keeps_offsets():
+	buf	= _buffer()
+	offsets	= list(buf.line_offsets())
+	data	= buf.encoded()
+	buf.patch(_matches(buf))
+	assert list(vim.current.buffer) == _expected()
+	assert buf.line_offsets() == offsets == _offsets(_expected())
+	assert buf.encoded() is data
+	assert bytes(data) == "\n".join(_expected()).encode("utf-8")
+
+def test_patch_by_offsets_only():
+	buf	= _buffer()
+	buf.patch([i[:3] for i in _matches(buf)])
+	assert list(vim.current.buffer) == _expected()
+
+def test_patch_of_other_length_moves_offsets():
+	buf	= _buffer(["аа бб", "вв"])
+	buf.line_offsets()
+	buf.patch([(5, 9, "г".encode("utf-8"))])
+	assert list(vim.current.buffer) == ["аа г", "вв"]
+	assert buf.line_offsets() == _offsets(["аа г", "вв"])
+
+def test_substitute_rejects_other_length():
+	buf	= _buffer()
+	with pytest.raises(ValueError):
+		buf.substitute([(0, 0, b"a", b"bb")])
+
+def _changes(matches):
+	# (line, column, 'е', 'ё') of MATCHES
+	result	= []
+	for start, end, replacement, line, column in matches:
+		for ye, yo in (("е", "ё"), ("Е", "Ё")):
+			yo	= yo.encode("utf-8")
+			pos	= replacement.find(yo)
+			while pos != -1:
+				result.append((line, column + pos, ye.encode("utf-8"), yo))
+				pos	= replacement.find(yo, pos + len(yo))
+	return result
+
+@pytest.mark.skipif(shutil.which("vim") is None, reason="vim is not installed")
+def test_substitute_in_vim(tmp_path):
+	buf	= _buffer()
+	del vim.commands[:]
+	assert buf.substitute(_changes(_matches(buf)))
+	assert len(vim.commands) == 1
+
+	text	= tmp_path / "text.txt"
+	script	= tmp_path / "script.vim"
+	text.write_text("\n".join(LINES) + "\n", encoding="utf-8")
+	script.write_text("let @/ = 'keep'\n" + vim.commands[0] +
+		"\nif @/ !=# 'keep' | cquit | endif\n", encoding="utf-8")
+	subprocess.run(["vim", "-Es", "-u", "NONE", "-i", "NONE", "-N",
+		"-c", "set encoding=utf-8", "-c", "source " + str(script),
+		"-c", "wq", str(text)], check=True, timeout=60,
+		env=dict(os.environ, HOME=str(tmp_path)))
+	result	= text.read_text(encoding="utf-8").split("\n")[:-1]
+	assert result == _expected()
+	assert _offsets(result) == _offsets(LINES)
+
+def test_seek_does_not_join_buffer():
+	buf	= _buffer()
+	size	= len("\n".join(LINES).encode("utf-8"))
+	buf.seek(10 ** 6)
+	assert buf.tell() == size
+	buf.seek(5, 2)
+	assert buf.tell() == size - 5
+	buf.seek(-3, 1)
+	assert buf.tell() == size - 8
+	assert buf._Buffer__data is None
@@ -0,0 +1,67 @@
+import pytest
+
+import engine
+
+OPTIONAL	= {"все": "всё", "небо": "нёбо"}
+NECESSARY	= {"еще": "ещё", "ежик": "ёжик", "елка": "ёлка"}
+
+def _engine(encoding="utf-8"):
+	return engine.ByteEngine(encoding, optional=OPTIONAL, necessary=NECESSARY)
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1251", "koi8-r"])
+def test_keeps_case(encoding):
+	scanner	= _engine(encoding)
+	data	= "Еще ЕЩЕ еще, ежик и Елка".encode(encoding)
+	result	= scanner.patch(data, scanner.scan(data, "necessary"))
+	assert result.decode(encoding) == "Ещё ЕЩЁ ещё, ёжик и Ёлка"
+
+def test_tables_are_separate():
+	scanner	= _engine()
+	data	= "все еще".encode("utf-8")
+	assert [i[2] for i in scanner.scan(data, "optional")] == ["всё".encode("utf-8")]
+	assert [i[2] for i in scanner.scan(data, "necessary")] == ["ещё".encode("utf-8")]
+
+def test_scan_lines_offsets():
+	scanner	= _engine()
+	lines	= [i.encode("utf-8") for i in ("еще", "", "а еще")]
+	assert list(scanner.scan_lines(enumerate(lines), "necessary")) == [
+		(0, 6, "ещё".encode("utf-8"), 0, 0),
+		(11, 17, "ещё".encode("utf-8"), 2, 3)]
+
+def test_codec_without_cyrillic_finds_nothing():
+	scanner	= engine.ByteEngine("latin1", optional=OPTIONAL, necessary=NECESSARY)
+	assert scanner.scan("café crème".encode("latin1"), "necessary") == []
+
+@pytest.mark.parametrize("data", [
+	b"\xd0\xb5\xff \xd0\x95\xd1\x89\xd0\xb5",
+	b"\xd0\x95\xed\xa0\x80 \xd0\x95\xd1\x89\xd0\xb5",
+])
+def test_invalid_bytes(data):
+	scanner	= _engine()
+	assert scanner.scan(data, "necessary") == [(len(data) - 6, len(data),
+			"Ещё".encode("utf-8"))]
+	assert scanner.lower(data) == data.replace(b"\xd0\x95", b"\xd0\xb5")
+
+@pytest.mark.parametrize("space", [" ", " ", " ", "　", " "])
+def test_unicode_spaces_separate_words(space):
+	scanner	= _engine()
+	data	= ("Он еще%s— не знал,%sеще%sелка" % (space, space, space)).encode("utf-8")
+	found	= [data[i[0]:i[1]].decode("utf-8") for i in scanner.scan(data, "necessary")]
+	assert found == ["еще", "еще", "елка"]
+	start	= data.index("елка".encode("utf-8"))
+	assert scanner.neighbours(data, start, start + 8) == ("еще", "")
+
+def test_nbsp_in_single_byte_codec():
+	scanner	= _engine("cp1251")
+	data	= "Он еще — не".encode("cp1251")
+	assert scanner.scan(data, "necessary") == [(3, 6, "ещё".encode("cp1251"))]
+
+def test_neighbours_inside_paragraph():
+	scanner	= _engine()
+	data	= "Конец.\n\nеще елка\n\nНачало".encode("utf-8")
+	lo	= data.index(b"\n\n") + 2
+	hi	= data.rindex(b"\n\n")
+	first, second	= lo, data.index("елка".encode("utf-8"))
+	assert scanner.neighbours(data, first, first + 6) == ("конец", "елка")
+	assert scanner.neighbours(data, first, first + 6, lo=lo, hi=hi) == ("", "елка")
+	assert scanner.neighbours(data, second, second + 8, lo=lo, hi=hi) == ("еще", "")
@@ -0,0 +1,33 @@
+import engine, regions
+
+NECESSARY	= {"еще": "ещё"}
+
+def _words(filetype, text):
+	# lines of TEXT with words, which are not in protected regions
+	scanner	= engine.ByteEngine("utf-8", optional={}, necessary=NECESSARY)
+	lines	= [i.encode("utf-8") for i in text.split("\n")]
+	index	= regions.index(filetype, enumerate(lines))
+	result	= []
+	for start, end, replacement, line, column in scanner.scan_lines(
+			enumerate(lines), "necessary", skip=index.protects):
+		result.append(line)
+	return result
+
+def test_markdown_fence():
+	text	= "еще\n```\nеще = 1\n```\nеще `еще`\n~~~~\nеще\n~~~~\nеще"
+	assert _words("markdown", text) == [0, 4, 8]
+
+def test_tex_comments_and_verbatim():
+	text	= "еще % еще\n\\begin{verbatim}\nеще\n\\end{verbatim} еще\n\\% еще"
+	assert _words("tex", text) == [0, 3, 4]
+
+def test_c_comments():
+	text	= "x = 1; // еще\n/* еще\nеще */ еще\nеще /* еще */ еще"
+	assert _words("c", text) == [2, 3, 3]
+
+def test_plain_text_keeps_words():
+	assert _words("", "еще\nеще_еще еще") == [0, 1]
+
+def test_underscores_without_identifier_keep_words():
+	text	= "_еще_\nеще__\n__еще\nеще_1\nx_еще_y\n* _еще_ *"
+	assert _words("markdown", text) == [0, 1, 2, 5]
@@ -0,0 +1,94 @@
+import json, asyncio
+
+import pytest
+
+import engine, server, watch
+
+OPTIONAL	= {"все": "всё"}
+NECESSARY	= {"еще": "ещё", "елка": "ёлка"}
+
+class Failing(watch.Corrector):
+	# corrector, which fails on texts with 'сбой'
+	def correct_many(self, texts):
+		if any("сбой".encode("utf-8") in data for data, filetype in texts):
+			raise RuntimeError("сбой")
+		return watch.Corrector.correct_many(self, texts)
+
+def _corrector(kind=watch.Corrector):
+	return kind(engine.ByteEngine("utf-8", optional=OPTIONAL, necessary=NECESSARY))
+
+async def _exchange(requests, corrector=None):
+	# answers of the server to raw REQUESTS, each on its own connection
+	service	= server.Server(corrector or _corrector())
+	batcher	= asyncio.ensure_future(service.batcher.run())
+	listener	= await asyncio.start_server(service.handle, "127.0.0.1", 0)
+	port	= listener.sockets[0].getsockname()[1]
+	result	= []
+	try:
+		for request in requests:
+			reader, writer	= await asyncio.open_connection("127.0.0.1", port)
+			writer.write(request)
+			await writer.drain()
+			status	= int((await reader.readline()).split()[1])
+			headers	= await server._headers(reader)
+			body	= await reader.readexactly(server._length(headers))
+			writer.close()
+			result.append((status, json.loads(body)))
+	finally:
+		listener.close()
+		await listener.wait_closed()
+		batcher.cancel()
+	return result
+
+def _post(body, length=None):
+	if length is None:
+		length	= len(body)
+	return ("POST /correct HTTP/1.1\r\nConnection: close\r\n"
+		"Content-Length: %d\r\n\r\n" % length).encode("latin-1") + body
+
+def test_correct():
+	body	= json.dumps({"text": "Еще елка, все."}).encode("utf-8")
+	texts	= json.dumps({"texts": ["еще", "еще", "нет"]}).encode("utf-8")
+	(status, payload), (multi, many)	= asyncio.run(_exchange([_post(body), _post(texts)]))
+	assert (status, payload) == (200, {"text": "Ещё ёлка, все.", "words": 2})
+	assert (multi, many) == (200, {"texts": ["ещё", "ещё", "нет"], "words": [1, 1, 0]})
+
+@pytest.mark.parametrize("request_", [
+	_post(b"{}", -1),
+	b"POST /correct HTTP/1.1\r\nContent-Length: many\r\n\r\n",
+	b"POST /correct HTTP/1.1\r\nno colon\r\n\r\n",
+	b"BROKEN\r\n\r\n",
+	_post(b"not json"),
+	_post(b'{"text": 1}'),
+])
+def test_malformed_requests(request_):
+	[(status, payload)]	= asyncio.run(_exchange([request_]))
+	assert status == 400
+	assert "error" in payload
+
+def test_lone_surrogate():
+	body	= b'{"text": "\\u0435\\u0449\\u0435 \\ud800\\u0435"}'
+	[(status, payload)]	= asyncio.run(_exchange([_post(body)]))
+	assert status == 400
+	assert "error" in payload
+
+def test_failed_text_does_not_fail_batch():
+	async def run():
+		batcher	= server.Batcher(_corrector(Failing), server.Stats(), window=0.01)
+		worker	= asyncio.ensure_future(batcher.run())
+		texts	= ["еще", "сбой еще", "елка"]
+		try:
+			return await asyncio.gather(*[batcher.submit(i.encode("utf-8"))
+					for i in texts], return_exceptions=True)
+		finally:
+			worker.cancel()
+	first, failed, last	= asyncio.run(run())
+	assert first == ("ещё".encode("utf-8"), 1)
+	assert isinstance(failed, RuntimeError)
+	assert last == ("ёлка".encode("utf-8"), 1)
+
+def test_unexpected_error_answers_500():
+	body	= json.dumps({"text": "сбой"}).encode("utf-8")
+	[(status, payload)]	= asyncio.run(_exchange([_post(body)], _corrector(Failing)))
+	assert status == 500
+	assert "сбой" in payload["error"]
@@ -0,0 +1,43 @@
+import vim, spellchecker
+
+class Checker:
+	# spellchecker, which records scanned blocks of lines
+	def __init__(self, lines, first, last, size):
+		self.buffer	= type("Buffer", (), {"buffer": vim.Buffer([""] * lines)})()
+		self.first	= first
+		self.last	= last
+		self.slice_lines	= size
+		self.context	= None
+		self.blocks	= []
+
+	def candidates(self, table):
+		self.blocks.append((self.first, self.last))
+		return []
+
+	def memory_correction(self, matches):
+		return matches
+
+def test_sliced_scan_covers_lines_once():
+	checker	= Checker(100, 3, 95, 10)
+	scan	= spellchecker.SlicedScan(checker, "optional")
+	scan.above, scan.below, scan.ranges	= 40, 50, [(40, 50)]
+	while not scan.done:
+		scan.step(0)
+	lines	= sorted(i for first, last in checker.blocks for i in range(first, last))
+	assert lines == list(range(3, 95))
+
+def test_memory_of_each_project(tmp_path):
+	names	= []
+	for project in ("first", "second"):
+		(tmp_path / project / ".git").mkdir(parents=True)
+		names.append(str(tmp_path / project / "text.txt"))
+	checker	= spellchecker.YoSpellchecker(str(tmp_path / "yo"), None)
+	checker.memory_dir	= str(tmp_path / "memory")
+	memories	= []
+	for name in names + names[:1]:
+		checker.buffer	= type("Buffer", (), {"buffer": vim.Buffer([], name=name)})()
+		checker.open_memory()
+		memories.append(checker.memory)
+	assert memories[0] is memories[2] is not memories[1]
+	checker.close_memory()
+	assert checker.memory is None and not checker.memories
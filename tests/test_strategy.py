@@ -0,0 +1,43 @@
+import pytest
+
+import engine, strategy
+
+THRESHOLDS	= {"vector": 1 << 20, "parallel": 32 << 20, "incremental": 256 << 10}
+
+@pytest.mark.parametrize("size, checked, vectorized, expected", [
+	(1 << 10, False, True, "lines"),
+	(1 << 10, True, True, "lines"),
+	(512 << 10, False, True, "lines"),
+	(512 << 10, True, True, "incremental"),
+	(2 << 20, False, True, "vector"),
+	(2 << 20, False, False, "lines"),
+	(2 << 20, True, True, "incremental"),
+	(64 << 20, False, True, "parallel"),
+	(64 << 20, True, True, "incremental"),
+])
+def test_choose(size, checked, vectorized, expected):
+	assert strategy.choose(size, THRESHOLDS, checked, vectorized) == expected
+
+def test_choose_never():
+	never	= dict((i, 0) for i in THRESHOLDS)
+	assert strategy.choose(1 << 30, never, True) == "lines"
+
+@pytest.mark.parametrize("forced, vectorized, expected", [
+	("parallel", True, "parallel"),
+	("vector", False, "lines"),
+	("unknown", True, "lines"),
+])
+def test_choose_forced(forced, vectorized, expected):
+	assert strategy.choose(1 << 10, THRESHOLDS, False, vectorized, forced) == expected
+
+def test_incremental_rescans_changed_chunks_only():
+	scanner	= engine.ByteEngine("utf-8", optional={}, necessary={"еще": "ещё"})
+	lines	= [("строка %d еще" % i).encode("utf-8") for i in range(2000)]
+	cache	= strategy.Incremental()
+	first	= list(cache.scan_lines(scanner, enumerate(lines), "necessary"))
+	assert first == list(scanner.scan_lines(enumerate(lines), "necessary"))
+	misses	= cache.misses
+	lines[1000]	= "еще".encode("utf-8")
+	again	= list(cache.scan_lines(scanner, enumerate(lines), "necessary"))
+	assert again == list(scanner.scan_lines(enumerate(lines), "necessary"))
+	assert cache.misses - misses < misses
@@ -0,0 +1,28 @@
+import tiered
+
+TABLE	= {"еще": "ещё", "елка": "ёлка", "ежик": "ёжик"}
+
+def _table(tmp_path, encoding="utf-8"):
+	path	= str(tmp_path / "necessary.cold")
+	tiered.build(path, TABLE, (0, 0))
+	return tiered.TieredTable(tiered.ColdTable(path)).encoded(encoding)
+
+def test_lookup_and_overlay(tmp_path):
+	table	= _table(tmp_path, "cp1251")
+	assert table["елка".encode("cp1251")] == "ёлка".encode("cp1251")
+	assert "нет".encode("cp1251") not in table
+	table["нет".encode("cp1251")]	= "нёт".encode("cp1251")
+	assert table.pop("еще".encode("cp1251")) == "ещё".encode("cp1251")
+	assert table.get("нет".encode("cp1251")) == "нёт".encode("cp1251")
+	assert "еще".encode("cp1251") not in table
+
+def test_changes_release_hot_bytes(tmp_path):
+	table	= _table(tmp_path)
+	for word in TABLE:
+		table.get(word.encode("utf-8"))
+	assert table.tier.resident > 0
+	table["еще".encode("utf-8")]	= "ещё".encode("utf-8")
+	table.pop("елка".encode("utf-8"))
+	table["ежик".encode("utf-8")]	= "ёжик".encode("utf-8")
+	assert not table.tier.hot
+	assert table.tier.resident == 0
@@ -0,0 +1,55 @@
+import pytest
+
+import engine, vector
+
+OPTIONAL	= {"все": "всё", "небо": "нёбо", "передохнем": "передохнём"}
+NECESSARY	= {"еще": "ещё", "ежик": "ёжик", "елка": "ёлка", "черт": "чёрт"}
+
+TEXT		= "Еще все ежики под елкой. ЕЩЕ! Ёлка, небо;\n"\
+		"черт-те что, передохнем, Все\tеще, ЕЖИК.\n" * 50
+
+pytestmark	= pytest.mark.skipif(not vector.available(), reason="NumPy is not installed")
+
+def _engines(encoding):
+	return (engine.ByteEngine(encoding, optional=OPTIONAL, necessary=NECESSARY),
+		vector.VectorEngine(encoding, optional=OPTIONAL, necessary=NECESSARY))
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1251", "koi8-r"])
+@pytest.mark.parametrize("table", engine.KINDS)
+def test_scan_matches_byte_engine(encoding, table):
+	slow, fast	= _engines(encoding)
+	data	= TEXT.encode(encoding)
+	expected	= slow.scan(data, table)
+	assert expected
+	assert fast.scan(data, table) == expected
+
+@pytest.mark.parametrize("encoding", ["utf-8", "cp1251"])
+def test_scan_by_small_blocks(encoding):
+	slow, fast	= _engines(encoding)
+	fast.block	= 64
+	data	= TEXT.encode(encoding)
+	assert fast.scan(data, "necessary") == slow.scan(data, "necessary")
+
+def test_scan_of_part_with_skip():
+	slow, fast	= _engines("utf-8")
+	data	= TEXT.encode("utf-8")
+	skip	= lambda start, end: start % 3 == 0
+	assert fast.scan(data, "necessary", 100, 2000, skip, 7) ==\
+		slow.scan(data, "necessary", 100, 2000, skip, 7)
+
+def test_dictionary_updates():
+	slow, fast	= _engines("utf-8")
+	data	= "звезды еще".encode("utf-8")
+	fast.scan(data, "necessary")
+	for i in (slow, fast):
+		i.add("necessary", "звезды", "звёзды")
+		i.remove("necessary", "еще")
+	assert fast.scan(data, "necessary") == slow.scan(data, "necessary") ==\
+		[(0, 12, "звёзды".encode("utf-8"))]
+
+def test_unicode_spaces():
+	slow, fast	= _engines("utf-8")
+	data	= "Он еще — не знал, еще елка　еще\u0085еще\n".encode("utf-8") * 20
+	expected	= slow.scan(data, "necessary")
+	assert len(expected) == 100
+	assert fast.scan(data, "necessary") == expected
@@ -0,0 +1,43 @@
+"""
+Fake of vim's python interface for tests of modules, which need vim
+
+Buffers are lists of str lines in utf-8 with unix fileformat, commands
+are recorded in COMMANDS
+"""
+
+class Buffer(list):
+	def __init__(self, lines, number=1, name=""):
+		list.__init__(self, lines)
+		self.number	= number
+		self.name	= name
+		self.options	= {"fileformat": "unix"}
+
+	def __setitem__(self, key, value):
+		if isinstance(key, slice):
+			value	= [i.decode("utf-8") if isinstance(i, bytes) else i for i in value]
+		elif isinstance(value, bytes):
+			value	= value.decode("utf-8")
+		list.__setitem__(self, key, value)
+
+class Current:
+	def __init__(self):
+		self.buffer	= Buffer([])
+
+current		= Current()
+buffers		= {}
+commands	= []
+
+def eval(expr):
+	if expr == "&fileformat":
+		return "unix"
+	if expr == "&encoding":
+		return "utf-8"
+	if expr == "&gdefault":
+		return "0"
+	if expr.startswith("line2byte("):
+		number	= int(expr[len("line2byte("):-1])
+		return str(sum(len(i.encode("utf-8")) + 1 for i in current.buffer[:number - 1]) + 1)
+	return "0"
+
+def command(text):
+	commands.append(text)
@@ -0,0 +1,333 @@
+"""
+Tiered dictionary for machines with little memory
+
+Every table of yo.txt ('optional', 'necessary') is written once into
+a cold file: words sorted by their bytes and an array of offsets to
+them. The file is mapped into memory (mmap), so only pages touched by
+binary search are read from disk, and the system may drop them any time
+
+In front of the cold file there is a small hot tier: LRU cache of
+looked up words (found or not), limited by number of entries and by
+approximate size in bytes (see HotTier). Tables of the same cold file
+in other encodings share it with its limits. It can be prewarmed by a
+list of frequent words, one per line, the most frequent first. Hot
+tier counts lookups, which were answered by it, and the ones, which
+went to cold file
+
+Cold files may be built from the shell:
+
+	python3 tiered.py yo.txt directory
+
+This module does not need vim
+"""
+import os, sys, mmap, struct
+from collections import OrderedDict
+
+#----GLOBAL VARS----
+
+MAGIC		= b"YOCOLD1\0"
+HEADER		= struct.Struct("<8sdqQ")
+
+HOT_ENTRIES	= 20000
+HOT_BYTES	= 4 << 20
+
+# approximate size of one cached entry besides its bytes
+ENTRY_OVERHEAD	= 160
+
+# value of hot tier for words, which are not in dictionary
+MISSING		= b""
+
+#----AUXILLIARY FUNCS----
+
+def build(path, table, stamp):
+	"""
+	Return:		int
+
+	Writes cold file PATH of TABLE dictionary {word with 'е': word
+	with 'ё'} for yo.txt with STAMP ((mtime, size) pair) and returns
+	number of words
+	"""
+	records	= sorted((key.encode("utf-8"), value.encode("utf-8"))
+			for key, value in table.items())
+	offsets	= [0]
+	data	= []
+	for key, value in records:
+		data.append(key + b"\t" + value)
+		offsets.append(offsets[-1] + len(data[-1]))
+
+	with open(path + ".tmp", "wb") as file:
+		file.write(HEADER.pack(MAGIC, stamp[0], stamp[1], len(records)))
+		file.write(struct.pack("<%dQ" % len(offsets), *offsets))
+		file.write(b"".join(data))
+	os.replace(path + ".tmp", path)
+	return len(records)
+
+def fresh(path, stamp):
+	"""
+	Return:		bool
+
+	Returns True, if cold file PATH was built for yo.txt with STAMP
+	"""
+	try:
+		with open(path, "rb") as file:
+			magic, mtime, size, count	= HEADER.unpack(file.read(HEADER.size))
+	except (OSError, struct.error):
+		return False
+	return magic == MAGIC and (mtime, size) == tuple(stamp)
+
+#----COLDTABLE----
+
+class ColdTable:
+	"""
+	Words of one table in memory mapped cold file PATH
+	"""
+	def __init__(self, path):
+		self.file	= open(path, "rb")
+		self.map	= mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+		magic, mtime, size, self.count	= HEADER.unpack_from(self.map)
+		start		= HEADER.size
+		self.offsets	= memoryview(self.map)[start:start + 8 * (self.count + 1)].cast("Q")
+		self.data	= start + 8 * (self.count + 1)
+
+	def __len__(self):
+		return self.count
+
+	def record(self, i):
+		"""
+		Return:		tuple
+
+		Returns (key, value) bytes of I-th word
+		"""
+		record	= self.map[self.data + self.offsets[i]:self.data + self.offsets[i + 1]]
+		key, value	= record.split(b"\t", 1)
+		return key, value
+
+	def get(self, key):
+		"""
+		Return:		bytes | None
+
+		Returns utf-8 word with YO for utf-8 KEY by binary search
+		"""
+		lo, hi	= 0, self.count
+		while lo < hi:
+			middle		= (lo + hi) // 2
+			current, value	= self.record(middle)
+			if current < key:
+				lo	= middle + 1
+			elif current > key:
+				hi	= middle
+			else:
+				return value
+		return None
+
+	def close(self):
+		"""
+		Return:		None
+
+		Unmaps the file
+		"""
+		self.offsets.release()
+		self.map.close()
+		self.file.close()
+
+#----TIEREDTABLE----
+
+class HotTier:
+	"""
+	LRU cache of looked up words, shared by tables of one cold file
+	in different encodings, so they have one budget and one set of
+	counters
+
+	instance.hot		OrderedDict {key: value or MISSING}; keys of
+				tables not in utf-8 are (encoding, key) pairs
+	instance.overlay	words changed after the cold file was built
+	instance.hits		lookups answered by hot tier
+	instance.misses		lookups, which went to cold file
+	"""
+	def __init__(self, entries=HOT_ENTRIES, size=HOT_BYTES):
+		self.entries	= entries
+		self.size	= size
+		self.hot	= OrderedDict()
+		self.overlay	= {}
+		self.resident	= 0
+		self.hits	= 0
+		self.misses	= 0
+
+	def full(self):
+		"""
+		Return:		bool
+
+		Returns True, if there is no room for new entries
+		"""
+		return len(self.hot) >= self.entries or self.resident >= self.size
+
+	def store(self, slot, key, value):
+		"""
+		Return:		None
+
+		Caches VALUE of KEY under SLOT and drops the oldest entries,
+		which do not fit into limits
+		"""
+		self.hot[slot]	= value
+		self.resident += len(key) + len(value) + ENTRY_OVERHEAD
+		while self.hot and (len(self.hot) > self.entries or self.resident > self.size):
+			old, value	= self.hot.popitem(last=False)
+			old	= old[1] if isinstance(old, tuple) else old
+			self.resident -= len(old) + len(value) + ENTRY_OVERHEAD
+
+	def drop(self, slot, key):
+		"""
+		Return:		None
+
+		Drops cached value of KEY under SLOT, if there is one
+		"""
+		value	= self.hot.pop(slot, None)
+		if value is not None:
+			self.resident -= len(key) + len(value) + ENTRY_OVERHEAD
+
+class TieredTable:
+	"""
+	Dictionary-like table with hot LRU tier in front of ColdTable
+	Keys and values are bytes in ENCODING
+
+	instance.tier		HotTier, shared by encoded() tables
+	"""
+	def __init__(self, cold, encoding="utf-8", entries=HOT_ENTRIES, size=HOT_BYTES,
+			tier=None):
+		self.cold	= cold
+		self.encoding	= encoding
+		self.tier	= HotTier(entries, size) if tier is None else tier
+
+	def encoded(self, encoding):
+		"""
+		Return:		TieredTable
+
+		Returns table with keys and values in ENCODING, which shares
+		the cold file and hot tier with this one
+		"""
+		if encoding == self.encoding:
+			return self
+		return TieredTable(self.cold, encoding, tier=self.tier)
+
+	def __slot(self, key):
+		return key if self.encoding == "utf-8" else (self.encoding, key)
+
+	def get(self, key, default=None):
+		tier	= self.tier
+		slot	= self.__slot(key)
+		value	= tier.overlay.get(slot, tier.hot.get(slot))
+		if value is not None:
+			if slot in tier.hot:
+				tier.hot.move_to_end(slot)
+			tier.hits += 1
+			return value if value != MISSING else default
+
+		tier.misses += 1
+		try:
+			utf8	= key if self.encoding == "utf-8" else\
+				key.decode(self.encoding).encode("utf-8")
+		except UnicodeError:
+			return default
+		value	= self.cold.get(utf8)
+		if value is not None and self.encoding != "utf-8":
+			value	= value.decode("utf-8").encode(self.encoding, "replace")
+		tier.store(slot, key, MISSING if value is None else value)
+		return default if value is None else value
+
+	def __getitem__(self, key):
+		value	= self.get(key)
+		if value is None:
+			raise KeyError(key)
+		return value
+
+	def __contains__(self, key):
+		return self.get(key) is not None
+
+	def __setitem__(self, key, value):
+		slot	= self.__slot(key)
+		self.tier.overlay[slot]	= value
+		self.tier.drop(slot, key)
+
+	def pop(self, key, default=None):
+		value	= self.get(key, default)
+		slot	= self.__slot(key)
+		self.tier.overlay[slot]	= MISSING
+		self.tier.drop(slot, key)
+		return value
+
+	def __len__(self):
+		return len(self.cold)
+
+	def items(self):
+		"""
+		Return:		generator
+
+		Yields (key, value) pairs of the cold file in ENCODING
+		(changes in overlay are not included)
+		"""
+		for i in range(len(self.cold)):
+			key, value	= self.cold.record(i)
+			if self.encoding != "utf-8":
+				key	= key.decode("utf-8").encode(self.encoding, "replace")
+				value	= value.decode("utf-8").encode(self.encoding, "replace")
+			yield key, value
+
+	def __iter__(self):
+		for key, value in self.items():
+			yield key
+
+	def values(self):
+		for key, value in self.items():
+			yield value
+
+	def prewarm(self, words):
+		"""
+		Return:		int
+
+		Looks up WORDS (str, the most frequent first), while hot
+		tier has room for them, and returns number of loaded words
+		"""
+		counter	= 0
+		tier	= self.tier
+		for word in words:
+			if tier.full():
+				break
+			try:
+				key	= word.strip().replace("ё", "е").encode(self.encoding)
+			except UnicodeError:
+				continue
+			if key and self.__slot(key) not in tier.hot:
+				self.get(key)
+				counter += 1
+		tier.hits	= 0
+		tier.misses	= 0
+		return counter
+
+	def stats(self):
+		"""
+		Return:		str
+
+		Returns counters of lookups and size of hot tier
+		"""
+		tier	= self.tier
+		total	= tier.hits + tier.misses
+		return "%d lookups, %.1f%% hot, %d entries, ~%d KB of %d KB" % (total,
+			100.0 * tier.hits / total if total else 0.0, len(tier.hot),
+			tier.resident >> 10, tier.size >> 10)
+
+def main(argv=sys.argv):
+	if len(argv) < 3:
+		print("Usage: %s yo.txt directory" % argv[0])
+		return 1
+
+	import spellfile
+	stat	= os.stat(argv[1])
+	stamp	= (stat.st_mtime, stat.st_size)
+	os.makedirs(argv[2], exist_ok=True)
+	for name, table in zip(("optional", "necessary"), spellfile.read_txt(argv[1])):
+		counter	= build(os.path.join(argv[2], name), table, stamp)
+		print("%d words written into %s" % (counter, os.path.join(argv[2], name)))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,320 @@
+"""
+Vectorized scanner for words, written without YO (needs NumPy)
+
+VectorEngine finds the same candidates as engine.ByteEngine, but
+without Python-level iteration over words of the text:
+
+	1. bytes of the text become a NumPy array, separators and
+	   'е'/'Е' are found by table lookups and comparisons
+	2. words with 'е'/'Е' are cut out by word boundaries
+	3. words are hashed in lower case all at once (polynomial hash
+	   by prefix sums), hashes are searched in sorted hashes of the
+	   dictionary by searchsorted()
+	4. only the words with found hashes are checked by dictionary
+	   lookup in Python, so hash collisions do not change results
+	   (the word, which is a key itself, needs no case fixing)
+
+Texts are processed by blocks of BLOCK bytes, so memory does not grow
+with the text. Codecs without stable byte patterns are scanned by
+ByteEngine. Without NumPy available() is False and scanner() returns
+ByteEngine
+
+Speed of both engines on the same text is compared by
+
+	python3 vector.py yo.txt corpus.txt [encoding]
+
+This module does not need vim
+"""
+import sys, time
+
+try:
+	import numpy
+except ImportError:
+	numpy	= None
+
+import engine
+
+#----GLOBAL VARS----
+
+BLOCK		= 1 << 18
+
+# base of the hash and its inverse modulo 2 ** 64
+BASE		= 0x100000001b3
+BASE_INVERSE	= pow(BASE, -1, 1 << 64)
+
+#----AUXILLIARY FUNCS----
+
+def available():
+	"""
+	Return:		bool
+
+	Returns True, if NumPy is installed
+	"""
+	return numpy is not None
+
+def scanner(encoding, **tables):
+	"""
+	Return:		engine.ByteEngine
+
+	Returns VectorEngine, if NumPy is installed, or ByteEngine
+	"""
+	if numpy is None:
+		return engine.ByteEngine(encoding, **tables)
+	return VectorEngine(encoding, **tables)
+
+def _powers(base, count):
+	result	= numpy.full(count, base, dtype=numpy.uint64)
+	result[0]	= 1
+	with numpy.errstate(over="ignore"):
+		return numpy.cumprod(result, dtype=numpy.uint64)
+
+def _hashes(words):
+	# the same hash as VectorEngine.__hash_words(), in Python
+	result	= []
+	for word in words:
+		value	= 0
+		power	= 1
+		for byte in word:
+			value	= (value + byte * power) & 0xffffffffffffffff
+			power	= (power * BASE) & 0xffffffffffffffff
+		result.append(value)
+	return result
+
+#----VECTORENGINE----
+
+class VectorEngine(engine.ByteEngine):
+	"""
+	ByteEngine with vectorized scan()
+
+	instance.hashes		sorted hashes of keys in lower case by
+				table name (built on demand)
+	"""
+	def __init__(self, encoding, **tables):
+		engine.ByteEngine.__init__(self, encoding, **tables)
+		self.hashes	= {}
+
+		separator	= numpy.zeros(256, dtype=bool)
+		for i in range(256):
+			separator[i]	= self.word.match(bytes([i])) is None
+		self.separator	= separator
+
+		# spaces longer than a byte (utf-8 NBSP, ...): {first byte:
+		# (length, table of the rest of bytes as a number)}
+		self.wide_spaces	= {}
+		if self.spaces is not None:
+			for i in engine.SPACES:
+				i	= i.encode(encoding)
+				if i[0] not in self.wide_spaces:
+					self.wide_spaces[i[0]]	= (len(i),
+						numpy.zeros(1 << 8 * (len(i) - 1), dtype=bool))
+				self.wide_spaces[i[0]][1][int.from_bytes(i[1:], "big")]	= True
+		# runs of first bytes (first, length - 1): comparisons of
+		# the whole text are cheaper than lookups
+		self.wide_leads	= []
+		for i in sorted(self.wide_spaces):
+			if self.wide_leads and sum(self.wide_leads[-1]) + 1 == i:
+				self.wide_leads[-1]	= (self.wide_leads[-1][0], self.wide_leads[-1][1] + 1)
+			else:
+				self.wide_leads.append((i, 0))
+		self.lower_table	= numpy.frombuffer(
+				self.lower(bytes(range(256))) if self.mode == "single"
+				else bytes(range(256)).lower(), dtype=numpy.uint8)
+
+		delta	= numpy.zeros(256, dtype=numpy.int16)
+		delta[0x90:0xa0]	= 0x20
+		delta[0xa0:0xb0]	= -0x20
+		delta[0x80:0x90]	= 0x10
+		self.cyrillic_delta	= delta
+		self.cyrillic_moved	= (delta != 0) & (delta != 0x20)
+
+		self.block	= BLOCK
+		self.powers	= _powers(BASE, self.block + 1)
+		self.inverses	= _powers(BASE_INVERSE, self.block + 1)
+
+	#----dictionary updates----
+
+	def add(self, table, key, word):
+		engine.ByteEngine.add(self, table, key, word)
+		self.hashes.pop(table, None)
+
+	def remove(self, table, key):
+		engine.ByteEngine.remove(self, table, key)
+		self.hashes.pop(table, None)
+
+	def __table_hashes(self, table):
+		if table not in self.hashes:
+			keys	= set(self.lower(i) for i in self.tables[table])
+			self.hashes[table]	= numpy.unique(numpy.array(
+						_hashes(keys), dtype=numpy.uint64))
+		return self.hashes[table]
+
+	#----vectorized steps----
+
+	def __lower_bytes(self, array):
+		# lower case of ASCII (and of single-byte codec) by table,
+		# of Cyrillic letters in utf-8 by their two-byte sequences
+		result	= self.lower_table[array]
+		if self.mode != "utf-8" or len(array) < 2:
+			return result, numpy.zeros(len(array), dtype=bool)
+
+		# second bytes after 0xd0: 'А'-'П' -> 'а'-'п' (d0 b0-bf),
+		# 'Р'-'Я' -> 'р'-'я' (d1 80-8f), 'Ѐ'-'Џ' -> 'ѐ'-'џ' (d1 90-9f)
+		lead	= array[:-1] == 0xd0
+		moved	= lead & self.cyrillic_moved[array[1:]]
+		result[1:]	+= numpy.where(lead, self.cyrillic_delta[array[1:]], 0).astype(numpy.uint8)
+		result[:-1][moved]	= 0xd1
+
+		# other letters may have case, which is not known here
+		unknown	= (array >= 0xc0) & (array != 0xd0) & (array != 0xd1)
+		return result, unknown
+
+	def __drop_spaces(self, array, word):
+		# marks bytes of multibyte spaces in ARRAY as not WORD ones
+		leads	= None
+		for first, width in self.wide_leads:
+			found	= (array - numpy.uint8(first)) <= width
+			leads	= found if leads is None else leads | found
+		leads	= numpy.flatnonzero(leads)
+		if not len(leads):
+			return
+		for lead, (width, table) in self.wide_spaces.items():
+			found	= leads[array[leads] == lead]
+			found	= found[found + width <= len(array)]
+			rest	= numpy.zeros(len(found), dtype=numpy.int64)
+			for i in range(1, width):
+				rest	= (rest << 8) | array[found + i]
+			found	= found[table[rest]]
+			for i in range(width):
+				word[found + i]	= False
+
+	def __centers(self, array):
+		if self.mode == "single":
+			return (array == self.ye[0]) | (array == self.ye_upper[0])
+		result	= numpy.zeros(len(array), dtype=bool)
+		if len(array) > 1:
+			result[:-1]	= (array[:-1] == self.ye[0]) &\
+				((array[1:] == self.ye[1]) | (array[1:] == self.ye_upper[1]))
+		return result
+
+	def __hash_words(self, lower, starts, ends):
+		# hash of word = (prefix[end] - prefix[start]) / BASE ** start
+		with numpy.errstate(over="ignore"):
+			prefix	= numpy.zeros(len(lower) + 1, dtype=numpy.uint64)
+			numpy.cumsum(lower.astype(numpy.uint64) * self.powers[:len(lower)],
+					dtype=numpy.uint64, out=prefix[1:])
+			return (prefix[ends] - prefix[starts]) * self.inverses[starts]
+
+	def __block(self, data, pos, endpos, hashes):
+		# returns (starts, ends) of words, which may be in dictionary,
+		# and of words, which must be checked in Python
+		array	= numpy.frombuffer(data, dtype=numpy.uint8, count=endpos - pos,
+					offset=pos)
+		word	= ~self.separator[array]
+		if self.wide_leads:
+			self.__drop_spaces(array, word)
+		edges	= numpy.diff(numpy.concatenate(([False], word, [False])).view(numpy.int8))
+		starts	= numpy.flatnonzero(edges == 1)
+		ends	= numpy.flatnonzero(edges == -1)
+		if not len(starts):
+			return starts, ends, starts, ends
+
+		# words with 'е' or 'Е'
+		numbers	= numpy.cumsum(edges[:-1] == 1) - 1
+		centers	= numpy.flatnonzero(self.__centers(array))
+		chosen	= numpy.zeros(len(starts), dtype=bool)
+		chosen[numbers[centers]] = True
+		starts, ends	= starts[chosen], ends[chosen]
+		if not len(starts):
+			return starts, ends, starts, ends
+
+		lower, unknown	= self.__lower_bytes(array)
+		found	= numpy.zeros(len(starts), dtype=bool)
+		if len(hashes):
+			values	= self.__hash_words(lower, starts, ends)
+			index	= numpy.minimum(numpy.searchsorted(hashes, values), len(hashes) - 1)
+			found	= hashes[index] == values
+
+		doubtful	= numpy.zeros(len(starts), dtype=bool)
+		unknown	= numpy.flatnonzero(unknown)
+		if len(unknown):
+			index	= numpy.searchsorted(ends, unknown, "right")
+			inside	= index < len(ends)
+			index	= index[inside]
+			index	= index[starts[index] <= unknown[inside]]
+			doubtful[index]	= True
+			doubtful	&= ~found
+		return starts[found], ends[found], starts[doubtful], ends[doubtful]
+
+	#----scanning----
+
+	def scan(self, data, table, pos=0, endpos=None, skip=None, shift=0):
+		if self.mode == "decode":
+			return engine.ByteEngine.scan(self, data, table, pos, endpos, skip, shift)
+		if endpos is None:
+			endpos	= len(data)
+
+		hashes	= self.__table_hashes(table)
+		get	= self.tables[table].get
+		lower	= self.lower
+		fix	= self.fix
+		result	= []
+		while pos < endpos:
+			# blocks end after a separator, so words are not cut
+			end	= min(pos + self.block, endpos)
+			if end < endpos:
+				separator	= numpy.flatnonzero(self.separator[numpy.frombuffer(
+						data, dtype=numpy.uint8, count=end - pos, offset=pos)])
+				if len(separator):
+					end	= pos + int(separator[-1]) + 1
+			found	= self.__block(data, pos, end, hashes)
+
+			words	= list(zip(found[0].tolist(), found[1].tolist())) +\
+				list(zip(found[2].tolist(), found[3].tolist()))
+			words.sort()
+			for start, stop in words:
+				start += pos
+				stop += pos
+				if skip is not None and skip(start + shift, stop + shift):
+					continue
+				token	= data[start:stop]
+				value	= get(token)
+				if value is not None:
+					# token is the key itself: replacement is the value
+					result.append((start, stop, value))
+					continue
+				value	= get(lower(token))
+				if value is not None:
+					result.append((start, stop, fix(token, value)))
+			pos	= end
+		return result
+
+def main(argv=sys.argv):
+	if len(argv) < 3:
+		print("Usage: %s yo.txt corpus.txt [encoding]" % argv[0])
+		return 1
+	if numpy is None:
+		print("NumPy is not installed")
+		return 1
+
+	import spellfile
+	optional, necessary	= spellfile.read_txt(argv[1])
+	encoding	= argv[3] if len(argv) > 3 else "utf-8"
+	with open(argv[2], "r", encoding="utf-8") as file:
+		data	= file.read().encode(encoding, "replace")
+
+	results	= []
+	for name, cls in (("finditer", engine.ByteEngine), ("numpy", VectorEngine)):
+		scanner	= cls(encoding, optional=optional, necessary=necessary)
+		scanner.scan(data[:4096], "necessary")
+		scanner.scan(data[:4096], "optional")
+		timer	= time.perf_counter()
+		found	= scanner.scan(data, "necessary") + scanner.scan(data, "optional")
+		timer	= time.perf_counter() - timer
+		results.append(found)
+		print("%-10s %8.1f ms %8.1f MB/s %d words" % (name, timer * 1000,
+			len(data) / timer / (1 << 20), len(found)))
+	print("results are %s" % ("equal" if results[0] == results[1] else "DIFFERENT"))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,505 @@
+"""
+Watch mode: words in files of a directory are corrected, as soon as
+files are written
+
+	python3 watch.py yo.txt directory [options]
+
+Files are watched by inotify (Linux) or by polling of their stamps.
+Bursts of writes are coalesced: a file is checked, when it was not
+written for SETTLE seconds. Necessary words are corrected, optional
+ones are corrected only by context model (yo.ctx next to yo.txt),
+when it is sure. Files are rewritten atomically with their mode and
+owner (symbolic and hard links are written in place). A file, which
+was written again while it was checked, is not rewritten, but checked
+once more
+
+Results are cached by content hash: a file, which was not changed since
+it was checked (or written here), is not read twice, and paragraphs,
+which were seen before, are not scanned again
+
+Every checked file is reported with its latency (from the first write
+event to the end of checking) and with depth of the queue of files,
+which wait for checking
+
+This module does not need vim
+"""
+import os, sys, re, time, fnmatch, hashlib, select, struct, signal, argparse
+import ctypes, ctypes.util
+from collections import OrderedDict
+
+import context, engine, regions, spellfile
+
+#----GLOBAL VARS----
+
+SETTLE		= 0.5
+INTERVAL	= 1.0
+CACHE_SIZE	= 1 << 16
+
+PARAGRAPH	= re.compile(rb"\n[ \t\r]*\n")
+
+FILETYPES	= {
+	".md"		: "markdown",
+	".markdown"	: "markdown",
+	".tex"		: "tex",
+}
+
+IN_MODIFY	= 0x00000002
+IN_CLOSE_WRITE	= 0x00000008
+IN_MOVED_TO	= 0x00000080
+IN_CREATE	= 0x00000100
+IN_Q_OVERFLOW	= 0x00004000
+IN_ISDIR	= 0x40000000
+IN_EVENT	= struct.Struct("iIII")
+
+#----AUXILLIARY FUNCS----
+
+def _digest(data):
+	return hashlib.blake2b(data, digest_size=16).digest()
+
+def _paragraphs(data):
+	# (start, end) pairs of paragraphs of DATA
+	start	= 0
+	for separator in PARAGRAPH.finditer(data):
+		yield start, separator.start()
+		start	= separator.end()
+	yield start, len(data)
+
+def _stamp(stat):
+	return (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def _walk(root):
+	# (folder, names of files) of ROOT without hidden folders
+	for folder, folders, files in os.walk(root):
+		folders[:]	= [i for i in folders if not i.startswith(".")]
+		yield folder, files
+
+def _write(path, data, stamp):
+	# writes DATA to PATH, if it still has STAMP (see _stamp()),
+	# and returns True; temporary file is hidden, so it is not watched
+	try:
+		stat	= os.stat(path)
+	except OSError:
+		return False
+	if _stamp(stat) != stamp:
+		return False
+	if os.path.islink(path) or stat.st_nlink > 1:
+		# replacing would break the link
+		with open(path, "r+b") as file:
+			file.write(data)
+			file.truncate()
+		return True
+
+	folder, name	= os.path.split(path)
+	temporary	= os.path.join(folder, ".%s.yo" % name)
+	with open(temporary, "wb") as file:
+		file.write(data)
+	try:
+		os.chmod(temporary, stat.st_mode & 0o7777)
+		os.chown(temporary, stat.st_uid, stat.st_gid)
+	except (OSError, AttributeError):
+		pass
+	os.replace(temporary, path)
+	return True
+
+#----CORRECTOR----
+
+class Corrector:
+	"""
+	Corrects words in texts paragraph by paragraph and caches
+	corrections of paragraphs by their hash
+
+	instance.scanner	engine.ByteEngine
+	instance.model		context.ContextModel or None
+	instance.cache		{paragraph hash: corrections} (LRU)
+	instance.hits		number of paragraphs found in cache
+	instance.misses		number of scanned paragraphs
+	"""
+	def __init__(self, scanner, model=None, threshold=0.95, size=CACHE_SIZE):
+		self.scanner	= scanner
+		self.model	= model
+		self.threshold	= threshold
+		self.cache	= OrderedDict()
+		self.size	= size
+		self.hits	= 0
+		self.misses	= 0
+
+	def __scan(self, pending):
+		# {key: (start, end, replacement) corrections relative to
+		# START} for PENDING {key: (data, start, end)} paragraphs,
+		# before protected regions are dropped; optional words of
+		# all the paragraphs are scored by one call of context model
+		scanner	= self.scanner
+		result	= {}
+		matches	= []
+		items	= []
+		for key, (data, start, end) in pending.items():
+			result[key]	= [(i[0] - start, i[1] - start, i[2])
+					for i in scanner.scan(data, "necessary", start, end)]
+			if self.model is None:
+				continue
+			for i in scanner.scan(data, "optional", start, end):
+				prev, next	= scanner.neighbours(data, i[0], i[1],
+							lo=start, hi=end)
+				word	= scanner.lower(i[2]).decode(scanner.encoding)
+				items.append((word.replace("ё", "е"), prev, next))
+				matches.append((key, (i[0] - start, i[1] - start, i[2])))
+
+		if items:
+			yo, ye, rest	= self.model.classify(items, self.threshold)
+			for i in yo:
+				key, match	= matches[i]
+				result[key].append(match)
+			for key in set(matches[i][0] for i in yo):
+				result[key].sort()
+		return result
+
+	def correct(self, data, filetype=""):
+		"""
+		Return:		tuple
+
+		Returns (corrected DATA, number of corrected words)
+		Words in protected regions of FILETYPE are kept
+		"""
+		return self.correct_many([(data, filetype)])[0]
+
+	def correct_many(self, texts):
+		"""
+		Return:		list
+
+		Returns (corrected data, number of corrected words) for every
+		(data, filetype) pair of TEXTS. Paragraphs are looked up in
+		cache, the rest of them is scanned as one batch: equal
+		paragraphs are scanned once
+		"""
+		found	= {}
+		pending	= OrderedDict()
+		jobs	= []
+		for data, filetype in texts:
+			paragraphs	= []
+			for start, end in _paragraphs(data):
+				key	= _digest(data[start:end])
+				paragraphs.append((key, start))
+				if key in found or key in pending:
+					self.hits += 1
+				elif key in self.cache:
+					self.cache.move_to_end(key)
+					found[key]	= self.cache[key]
+					self.hits += 1
+				else:
+					pending[key]	= (data, start, end)
+					self.misses += 1
+			jobs.append(paragraphs)
+
+		for key, result in self.__scan(pending).items():
+			found[key]	= self.cache[key]	= result
+			if len(self.cache) > self.size:
+				self.cache.popitem(last=False)
+
+		result	= []
+		for (data, filetype), paragraphs in zip(texts, jobs):
+			edits	= [(start + i[0], start + i[1], i[2])
+					for key, start in paragraphs for i in found[key]]
+			if edits:
+				# protected regions are needed for texts with words only
+				newline	= b"\r\n" if b"\r\n" in data else b"\n"
+				lines	= enumerate(data.split(newline))
+				index	= regions.index(filetype, lines, len(newline))
+				edits	= [i for i in edits if not index.protects(i[0], i[1])]
+			result.append((self.scanner.patch(data, edits), len(edits)))
+		return result
+
+def corrector(txt, encoding="utf-8", threshold=0.95):
+	"""
+	Return:		Corrector
+
+	Returns Corrector for TXT dictionary with context model, if
+	there is one next to it (.ctx)
+	"""
+	optional, necessary	= spellfile.read_txt(txt)
+	scanner	= engine.ByteEngine(encoding, optional=optional, necessary=necessary)
+	model	= None
+	ctx	= os.path.splitext(txt)[0] + ".ctx"
+	if os.path.exists(ctx):
+		model	= context.ContextModel.load(ctx)
+	return Corrector(scanner, model, threshold)
+
+#----WATCHERS----
+
+class PollingWatcher:
+	"""
+	Finds changed files by their (mtime, size) stamps
+	"""
+	def __init__(self, root):
+		self.root	= root
+		self.stamps	= {}
+		self.scan()
+
+	def scan(self):
+		"""
+		Return:		list
+
+		Returns paths of files, which were changed since last scan
+		"""
+		result	= []
+		stamps	= {}
+		for folder, files in _walk(self.root):
+			for name in files:
+				path	= os.path.join(folder, name)
+				try:
+					stat	= os.stat(path)
+				except OSError:
+					continue
+				stamps[path]	= (stat.st_mtime_ns, stat.st_size)
+				if self.stamps.get(path) != stamps[path]:
+					result.append(path)
+		self.stamps	= stamps
+		return result
+
+	def wait(self, timeout):
+		"""
+		Return:		list
+
+		Waits up to TIMEOUT seconds and returns changed paths
+		"""
+		time.sleep(min(timeout, INTERVAL))
+		return self.scan()
+
+class InotifyWatcher:
+	"""
+	Gets changed files from inotify of Linux kernel. If the queue
+	of events overflows, all the files are returned
+	"""
+	MASK	= IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+	def __init__(self, root):
+		self.libc	= ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+		self.fd		= self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+		if self.fd < 0:
+			raise OSError(ctypes.get_errno(), "inotify_init1() failed")
+		self.root	= root
+		self.folders	= {}
+		for folder, files in _walk(root):
+			self.add(folder)
+
+	def add(self, folder):
+		"""
+		Return:		None
+
+		Starts watching FOLDER
+		"""
+		number	= self.libc.inotify_add_watch(self.fd,
+				os.fsencode(folder), self.MASK)
+		if number < 0:
+			raise OSError(ctypes.get_errno(), "inotify_add_watch() failed", folder)
+		self.folders[number]	= folder
+
+	def rescan(self):
+		"""
+		Return:		list
+
+		Returns paths of all the files (events were lost) and starts
+		watching new folders
+		"""
+		watched	= set(self.folders.values())
+		result	= []
+		for folder, files in _walk(self.root):
+			if folder not in watched:
+				self.add(folder)
+			result.extend(os.path.join(folder, i) for i in files)
+		return result
+
+	def wait(self, timeout):
+		"""
+		Return:		list
+
+		Waits up to TIMEOUT seconds and returns written paths
+		"""
+		if not select.select([self.fd], [], [], timeout)[0]:
+			return []
+		try:
+			data	= os.read(self.fd, 1 << 16)
+		except BlockingIOError:
+			return []
+		result	= []
+		pos	= 0
+		while pos < len(data):
+			number, mask, cookie, length	= IN_EVENT.unpack_from(data, pos)
+			name	= data[pos + IN_EVENT.size:pos + IN_EVENT.size + length]
+			pos	+= IN_EVENT.size + length
+			if mask & IN_Q_OVERFLOW:
+				return self.rescan()
+			folder	= self.folders.get(number)
+			name	= os.fsdecode(name.rstrip(b"\0"))
+			if folder is None or not name or name.startswith("."):
+				continue
+			path	= os.path.join(folder, name)
+			if mask & IN_ISDIR:
+				if mask & (IN_CREATE | IN_MOVED_TO):
+					self.add(path)
+			else:
+				result.append(path)
+		return result
+
+def watcher(root, polling=False):
+	"""
+	Return:		InotifyWatcher | PollingWatcher
+
+	Returns inotify watcher of ROOT directory, or polling one, if
+	POLLING or inotify is not available
+	"""
+	if not polling and sys.platform.startswith("linux"):
+		try:
+			return InotifyWatcher(root)
+		except (OSError, AttributeError):
+			pass
+	return PollingWatcher(root)
+
+#----WATCH----
+
+class Watch:
+	"""
+	Queue of written files, which are checked, when they settle
+
+	instance.queue		{path: [time of first event, deadline]}
+	instance.digests	{path: hash of the content, which was checked}
+	"""
+	def __init__(self, corrector, patterns=("*",), settle=SETTLE, encoding="utf-8"):
+		self.corrector	= corrector
+		self.patterns	= patterns
+		self.settle	= settle
+		self.encoding	= encoding
+		self.queue	= {}
+		self.digests	= {}
+		self.checked	= 0
+		self.skipped	= 0
+
+	def push(self, path, now=None, settle=None):
+		"""
+		Return:		None
+
+		Adds PATH to the queue or moves its deadline SETTLE
+		(self.settle by default) seconds later
+		"""
+		name	= os.path.basename(path)
+		if name.startswith(".") or not any(fnmatch.fnmatch(name, i) for i in self.patterns):
+			return
+		now	= time.monotonic() if now is None else now
+		item	= self.queue.setdefault(path, [now, now])
+		item[1]	= now + (self.settle if settle is None else settle)
+
+	def timeout(self, default=INTERVAL):
+		"""
+		Return:		float
+
+		Returns seconds until the nearest deadline
+		"""
+		if not self.queue:
+			return default
+		return max(min(i[1] for i in self.queue.values()) - time.monotonic(), 0)
+
+	def process(self, now=None, report=print):
+		"""
+		Return:		int
+
+		Checks settled files and returns their number
+		"""
+		now	= time.monotonic() if now is None else now
+		ready	= sorted(path for path, item in self.queue.items() if item[1] <= now)
+		for path in ready:
+			first	= self.queue.pop(path)[0]
+			counter	= self.check(path)
+			if counter is None:
+				continue
+			report("%s: %d words, %.1f ms, queue %d, cache %d/%d" % (path,
+				counter, (time.monotonic() - first) * 1000,
+				len(self.queue), self.corrector.hits, self.corrector.misses))
+		return len(ready)
+
+	def check(self, path):
+		"""
+		Return:		int | None
+
+		Corrects words of the file PATH and returns their number
+		Returns None, if the file was not changed since last check
+		or if it was written again while it was checked (then it
+		is queued again)
+		"""
+		try:
+			with open(path, "rb") as file:
+				stamp	= _stamp(os.fstat(file.fileno()))
+				data	= file.read()
+		except OSError:
+			return None
+		digest	= _digest(data)
+		if self.digests.get(path) == digest:
+			self.skipped += 1
+			return None
+
+		self.checked += 1
+		try:
+			data.decode(self.encoding)
+		except UnicodeDecodeError:
+			self.digests[path]	= digest
+			return None
+		filetype	= FILETYPES.get(os.path.splitext(path)[1].lower(), "")
+		result, counter	= self.corrector.correct(data, filetype)
+		if counter and not _write(path, result, stamp):
+			self.push(path)
+			return None
+		self.digests[path]	= _digest(result)
+		return counter
+
+	def run(self, watcher, report=print):
+		"""
+		Return:		None
+
+		Checks files of WATCHER forever
+		"""
+		while True:
+			for path in watcher.wait(self.timeout()):
+				self.push(path)
+			self.process(report=report)
+
+def _stop(number, frame):
+	raise KeyboardInterrupt()
+
+def main(argv=sys.argv):
+	parser	= argparse.ArgumentParser(prog=argv[0],
+			description="Corrects words without YO in written files")
+	parser.add_argument("txt", help="yo.txt")
+	parser.add_argument("directory")
+	parser.add_argument("--pattern", action="append",
+			help="names of checked files (*.txt, ...), all by default")
+	parser.add_argument("--settle", type=float, default=SETTLE,
+			help="seconds without writes before check")
+	parser.add_argument("--encoding", default="utf-8")
+	parser.add_argument("--threshold", type=float, default=0.95,
+			help="confidence of context model for optional words")
+	parser.add_argument("--polling", action="store_true",
+			help="poll files instead of inotify")
+	parser.add_argument("--once", action="store_true",
+			help="check every file once and exit")
+	args	= parser.parse_args(argv[1:])
+
+	watch	= Watch(corrector(args.txt, args.encoding, args.threshold),
+			args.pattern or ["*"], args.settle, args.encoding)
+	files	= watcher(args.directory, args.polling)
+	print("Watching %s by %s" % (args.directory,
+		"inotify" if isinstance(files, InotifyWatcher) else "polling"))
+
+	for folder, names in _walk(args.directory):
+		for name in names:
+			watch.push(os.path.join(folder, name), settle=0)
+	watch.process()
+	if args.once:
+		return 0
+	signal.signal(signal.SIGTERM, _stop)
+	try:
+		watch.run(files)
+	except KeyboardInterrupt:
+		pass
+	print("%d files checked, %d unchanged skipped" % (watch.checked, watch.skipped))
+	return 0
+
+if __name__ == "__main__":
+	sys.exit(main())